@@ -0,0 +1,96 @@
+"""
+Times how long the scripts take to start, by running them with --help in fresh
+processes, next to how long the charting libraries they no longer import up front
+take to import on their own, which is what every run used to pay. Run from the repo
+root with `PYTHONPATH=. python benchmarks/imports.py`.
+"""
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import timeit
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+SCRIPTS = [
+    "visualize_data.py",
+    os.path.join("reports", "pr-review-turnaround", "visualize_data.py"),
+    "generate.py",
+    "run_pipeline.py",
+]
+# What the scripts imported before charts were drawn through lib/charts.py
+LIBRARIES = {
+    "chartify": "chartify",
+    "pandas": "pandas",
+    "matplotlib": "matplotlib.pyplot",
+}
+
+parser = argparse.ArgumentParser(
+    description="Times the start up of the scripts and the imports they put off"
+)
+parser.add_argument(
+    "-r", "--repeat", default=5, type=int, help="runs of each, keeping the fastest"
+)
+parser.add_argument(
+    "--top",
+    default=5,
+    type=int,
+    help="number of the slowest imports of each script to list",
+)
+args = parser.parse_args()
+
+
+def time_command(command):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, MPLBACKEND="Agg")
+
+    def run():
+        subprocess.run(
+            command, cwd=REPO_DIR, env=env, check=True, stdout=subprocess.DEVNULL
+        )
+
+    return min(timeit.repeat(run, number=1, repeat=args.repeat))
+
+
+def get_slowest_imports(script):
+    """
+    The top level modules `script` imports, with how long each took in seconds,
+    slowest first, from `python -X importtime`.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", script, "--help"],
+        cwd=REPO_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Nested imports are indented under the one that made them
+        if not name.startswith("  "):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[: args.top]
+
+
+print(f"{'start up with --help':<60} {'seconds':>8}")
+print(f"{'python':<60} {time_command([sys.executable, '-c', 'pass']):8.3f}")
+for script in SCRIPTS:
+    print(f"{script:<60} {time_command([sys.executable, script, '--help']):8.3f}")
+print()
+print(f"{'importing on its own':<60} {'seconds':>8}")
+for name, module in LIBRARIES.items():
+    if not importlib.util.find_spec(name):
+        print(f"{name:<60} {'missing':>8}")
+        continue
+    seconds = time_command([sys.executable, "-c", f"import {module}"])
+    print(f"{name:<60} {seconds:8.3f}")
+for script in SCRIPTS:
+    print()
+    print(f"slowest imports of {script}")
+    for seconds, name in get_slowest_imports(script):
+        print(f"  {name:<58} {seconds:8.3f}")
@@ -0,0 +1,122 @@
+"""
+Stress checks the request/response/resolution matching in generate.ReviewFactory on
+PRs with hundreds of review cycles, against the list scan it replaced. Run from the
+repo root with `PYTHONPATH=. python benchmarks/matching.py`.
+"""
+import argparse
+import random
+import timeit
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from businesstimedelta import Rules, WorkDayRule
+
+import generate
+from generate import ReviewConfig, ReviewFactory
+
+parser = argparse.ArgumentParser(
+    description="Checks and times matching reviews to requests on long-running PRs"
+)
+parser.add_argument(
+    "-c", "--cycles", default=2000, type=int, help="review cycles per reviewer"
+)
+parser.add_argument(
+    "-p", "--prs", default=20, type=int, help="number of pull requests to match"
+)
+parser.add_argument(
+    "-r", "--repeat", default=3, type=int, help="runs of each, keeping the fastest"
+)
+args = parser.parse_args()
+
+generate.WORKING_HOURS = defaultdict(lambda: Rules([WorkDayRule()]))
+REVIEWERS = ["alice", "bob", "carol"]
+START = datetime(2022, 1, 3, tzinfo=timezone.utc)
+
+
+def get_timeline(seed):
+    """
+    Requests, reviews and resolutions for each reviewer, with ties and reviews that
+    come before any request thrown in.
+    """
+    rng = random.Random(seed)
+
+    def get_times(count):
+        return {
+            START + timedelta(minutes=rng.randrange(args.cycles * 60))
+            for _ in range(count)
+        }
+
+    pr_review_requests = {reviewer: get_times(args.cycles) for reviewer in REVIEWERS}
+    pr_reviews = {reviewer: get_times(args.cycles) for reviewer in REVIEWERS}
+    for reviewer in REVIEWERS:
+        # Reviews at the same time as a request don't count as a response to it
+        pr_reviews[reviewer] |= set(rng.sample(sorted(pr_review_requests[reviewer]), 5))
+    pr_resolutions = sorted(get_times(args.cycles // 10))
+    return pr_review_requests, pr_reviews, pr_resolutions
+
+
+def match_by_scanning(
+    factory, reviewer, pr_review_requests, pr_reviews, pr_resolutions
+):
+    """
+    The matching as it was before, which scans every review and resolution for every
+    request.
+    """
+    matches = []
+    reviewer_requests = sorted(pr_review_requests.get(reviewer, set()))
+    reviewer_reviews = sorted(pr_reviews.get(reviewer, set()))
+    for request in reviewer_requests:
+        response = next(
+            iter([response for response in reviewer_reviews if response > request]),
+            None,
+        )
+        resolution = next(
+            iter([resolved for resolved in pr_resolutions if resolved > request]),
+            factory.review_config.end,
+        )
+        matches.append((request, response, resolution))
+    return matches
+
+
+def match(factory, reviewer, pr_review_requests, pr_reviews, pr_resolutions):
+    reviews = factory._get_reviews_for_reviewer_for_pr(
+        reviewer=reviewer,
+        pr_review_requests=pr_review_requests,
+        pr_reviews=pr_reviews,
+        pr_resolutions=pr_resolutions,
+        title="title",
+        repository_name="repository",
+        author="author",
+    )
+    return [(review.request, review.response, review.resolved) for review in reviews]
+
+
+# The window takes in every request, as those before it aren't matched
+factory = ReviewFactory(
+    ReviewConfig(
+        duration=timedelta(days=366),
+        end=START + timedelta(days=365),
+        target_review_time=timedelta(hours=3, minutes=30),
+    )
+)
+timelines = [get_timeline(seed) for seed in range(args.prs)]
+
+for timeline in timelines:
+    for reviewer in REVIEWERS + ["nobody"]:
+        expected = match_by_scanning(factory, reviewer, *timeline)
+        assert match(factory, reviewer, *timeline) == expected, reviewer
+print(f"Matching agrees on {args.prs} PRs with {args.cycles} cycles per reviewer")
+
+for name, function in [("scanning", match_by_scanning), ("ReviewFactory", match)]:
+    seconds = min(
+        timeit.repeat(
+            lambda: [
+                function(factory, reviewer, *timeline)
+                for timeline in timelines
+                for reviewer in REVIEWERS
+            ],
+            number=1,
+            repeat=args.repeat,
+        )
+    )
+    print(f"{name:<14} {seconds:8.3f}s")
@@ -0,0 +1,311 @@
+"""
+Times and measures the peak memory of each stage of the pipeline on synthetic data
+from lib/synthetic.py at several scales, and compares them with those stored in
+benchmarks/baseline.json, exiting with an error if any got slower or bigger than it
+allows. Run from the repo root with `PYTHONPATH=. python benchmarks/pipeline.py`,
+adding `--update-baseline` to store the results as the new baseline.
+
+Each stage runs in a fresh process, so its peak memory is its own and nothing is
+cached between them. Times include the imports each stage needs.
+"""
+import argparse
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+from collections import defaultdict
+from contextlib import redirect_stdout
+from datetime import datetime, time, timedelta, timezone
+
+from lib.raw_data import write_pull_requests_jsonl
+from lib.synthetic import GENERATOR_VERSION, PullRequestGenerator, get_logins
+
+STAGES = ["read", "transform", "visualize", "report", "generate", "trend"]
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+BASELINE_FILE = os.path.join(REPO_DIR, "benchmarks", "baseline.json")
+REPORT_DIR = os.path.join(REPO_DIR, "reports", "pr-review-turnaround")
+# Fixed, so the same data is generated every time
+END = datetime(2024, 1, 1, tzinfo=timezone.utc)
+DAYS = 365
+REPOSITORIES = 5
+REVIEWERS = 40
+AUTHORS = 120
+
+parser = argparse.ArgumentParser(
+    description="Benchmarks each stage of the pipeline on synthetic data against a baseline"
+)
+parser.add_argument(
+    "-s",
+    "--scales",
+    default=[10000, 100000],
+    type=int,
+    nargs="+",
+    help="numbers of PRs to benchmark with, up to a million or so",
+)
+parser.add_argument(
+    "--stages", default=STAGES, choices=STAGES, nargs="+", help="stages to run"
+)
+parser.add_argument(
+    "-r", "--repeat", default=3, type=int, help="runs of each, keeping the best"
+)
+parser.add_argument(
+    "--tolerance",
+    default=0.5,
+    type=float,
+    help="fraction a stage can be slower than the baseline before it's a regression",
+)
+parser.add_argument(
+    "--memory-tolerance",
+    default=0.1,
+    type=float,
+    help="fraction a stage can use more memory than the baseline",
+)
+parser.add_argument(
+    "--work-dir",
+    help="directory to keep the generated data in between runs; defaults to a"
+    " temporary one",
+)
+parser.add_argument(
+    "--update-baseline",
+    action="store_true",
+    help="store these results in the baseline rather than comparing with it",
+)
+# How the benchmark runs each stage in a process of its own
+parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+
+
+def generate_data(directory, scale):
+    """
+    Writes `scale` synthetic PRs to `directory`/data/raw, unless they're already there.
+    """
+    raw_dir = os.path.join(directory, "data", "raw")
+    marker = os.path.join(directory, "synthetic.json")
+    settings = [
+        GENERATOR_VERSION,
+        scale,
+        END.isoformat(),
+        DAYS,
+        REPOSITORIES,
+        REVIEWERS,
+        AUTHORS,
+    ]
+    if os.path.exists(marker):
+        with open(marker) as fh:
+            if json.load(fh) == settings:
+                return
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(raw_dir)
+    reviewers = get_logins("reviewer", REVIEWERS)
+    generator = PullRequestGenerator(
+        reviewers=reviewers,
+        authors=reviewers + get_logins("author", AUTHORS),
+        teams=get_logins("team", 3),
+        end=END,
+        days=DAYS,
+    )
+    for i, repository in enumerate(get_logins("repo", REPOSITORIES)):
+        count = scale // REPOSITORIES + (i < scale % REPOSITORIES)
+        with open(os.path.join(raw_dir, f"{repository}.jsonl"), "w") as fh:
+            write_pull_requests_jsonl(generator.generate(repository, count), fh)
+    with open(marker, "w") as fh:
+        json.dump(settings, fh)
+
+
+def run_read(data_dir):
+    from lib.events import EventTable
+    from lib.raw_data import read_raw_data
+
+    EventTable.from_pull_requests(read_raw_data(os.path.join(data_dir, "data", "raw")))
+
+
+def run_transform(data_dir):
+    # As generate_all_charts.sh runs it, over every PR
+    days_old = (datetime.now(timezone.utc) - END).days + DAYS + 1
+    sys.argv = ["transform_data.py", "--days-old", str(days_old)]
+    os.chdir(data_dir)
+    runpy.run_path(os.path.join(REPORT_DIR, "transform_data.py"), run_name="__main__")
+
+
+def run_visualize(data_dir):
+    sys.argv = [
+        "visualize_data.py",
+        os.path.join(data_dir, "chart.html"),
+        "-f",
+        os.path.join(data_dir, "data", "raw", "transformed.json"),
+    ]
+    runpy.run_path(os.path.join(REPORT_DIR, "visualize_data.py"), run_name="__main__")
+
+
+def run_report(data_dir):
+    # transform and visualize as run_pipeline.py runs them, in one process
+    days_old = (datetime.now(timezone.utc) - END).days + DAYS + 1
+    sys.argv = ["run_pipeline.py", "--days-old", str(days_old)]
+    os.chdir(data_dir)
+    runpy.run_path(os.path.join(REPO_DIR, "run_pipeline.py"), run_name="__main__")
+
+
+def run_generate(data_dir, trend=False):
+    from businesstimedelta import LunchTimeRule, Rules, WorkDayRule
+
+    import generate
+    from generate import ReviewConfig, ReviewFactory, get_trend_windows
+    from lib.raw_data import read_raw_data
+
+    generate.GITHUB_NAMES = {}
+    working_hours = Rules(
+        [
+            WorkDayRule(
+                start_time=time(hour=9),
+                end_time=time(hour=17, minute=30),
+                working_days=[0, 1, 2, 3, 4],
+            ),
+            LunchTimeRule(
+                start_time=time(hour=12, minute=30),
+                end_time=time(hour=13, minute=30),
+                working_days=[0, 1, 2, 3, 4],
+            ),
+        ]
+    )
+    generate.WORKING_HOURS = defaultdict(lambda: working_hours)
+    review_config = ReviewConfig(
+        duration=timedelta(weeks=4),
+        end=END,
+        target_review_time=timedelta(hours=3, minutes=30),
+    )
+    trend_windows = None
+    if trend:
+        # A year of weekly windows, as in generate.py's trend mode
+        trend_windows = get_trend_windows(review_config, timedelta(weeks=1), 52)
+        review_config = ReviewConfig(
+            duration=END - trend_windows[0].start,
+            end=END,
+            target_review_time=review_config.target_review_time,
+        )
+    raw_data = read_raw_data(
+        os.path.join(data_dir, "data", "raw"), active_after=review_config.start
+    )
+    factory = ReviewFactory(review_config, trend_windows=trend_windows)
+    factory.create(raw_data).print_stats()
+
+
+STAGE_FUNCTIONS = {
+    "read": run_read,
+    "transform": run_transform,
+    "visualize": run_visualize,
+    "report": run_report,
+    "generate": run_generate,
+    "trend": lambda data_dir: run_generate(data_dir, trend=True),
+}
+
+
+def run_stage(stage, data_dir):
+    """
+    Runs `stage` in a new process, returning how long it took in seconds and its peak
+    resident memory in MiB, or None if it failed.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, MPLBACKEND="Agg")
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--run-stage", stage, "--data-dir", data_dir],
+        stdout=subprocess.PIPE,
+        env=env,
+    )
+    output = process.stdout.read()
+    process.stdout.close()
+    # Waiting for it this way gives the resources it alone used
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        return None
+    # Linux gives the peak in KiB, macOS in bytes
+    peak = usage.ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+    return json.loads(output)["seconds"], peak
+
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    """
+    Prints the results next to the baseline, returning whether any regressed.
+    """
+    regressed = False
+    print(
+        f"{'scale':>8} {'stage':<10} {'seconds':>9} {'baseline':>9}"
+        f" {'MiB':>8} {'baseline':>9}"
+    )
+    for scale, stages in results.items():
+        for stage, result in stages.items():
+            expected = baseline.get(scale, {}).get(stage)
+            if result is None:
+                print(f"{scale:>8} {stage:<10} failed")
+                regressed = regressed or expected is not None
+                continue
+            seconds, peak = result["seconds"], result["peak_mib"]
+            line = f"{scale:>8} {stage:<10} {seconds:9.2f}"
+            if not expected:
+                print(f"{line} {'-':>9} {peak:8.1f} {'-':>9}")
+                continue
+            problems = []
+            if seconds > expected["seconds"] * (1 + tolerance):
+                problems.append("slower")
+            if peak > expected["peak_mib"] * (1 + memory_tolerance):
+                problems.append("bigger")
+            regressed = regressed or bool(problems)
+            print(
+                f"{line} {expected['seconds']:9.2f} {peak:8.1f}"
+                f" {expected['peak_mib']:9.1f} {' and '.join(problems)}".rstrip()
+            )
+    return regressed
+
+
+def main(args):
+    work_dir = args.work_dir or tempfile.mkdtemp()
+    results = {}
+    try:
+        for scale in args.scales:
+            data_dir = os.path.join(os.path.abspath(work_dir), str(scale))
+            generate_data(data_dir, scale)
+            results[str(scale)] = {}
+            for stage in args.stages:
+                runs = [run_stage(stage, data_dir) for _ in range(args.repeat)]
+                if None in runs:
+                    print(f"{stage} failed at {scale} PRs", file=sys.stderr)
+                    results[str(scale)][stage] = None
+                    continue
+                results[str(scale)][stage] = {
+                    "seconds": round(min(seconds for seconds, _ in runs), 3),
+                    "peak_mib": round(min(peak for _, peak in runs), 1),
+                }
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir)
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as fh:
+            baseline = json.load(fh)
+    regressed = compare(results, baseline, args.tolerance, args.memory_tolerance)
+    if args.update_baseline:
+        for scale, stages in results.items():
+            baseline.setdefault(scale, {}).update(
+                (stage, result) for stage, result in stages.items() if result
+            )
+        with open(BASELINE_FILE, "w") as fh:
+            json.dump(baseline, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+    elif regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.run_stage:
+        start = timeit.default_timer()
+        # The stages' own output would get in the way of the result
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            STAGE_FUNCTIONS[args.run_stage](args.data_dir)
+        print(json.dumps({"seconds": timeit.default_timer() - start}))
+    else:
+        main(args)
@@ -0,0 +1,75 @@
+"""
+Compares the percentiles of review durations from `DurationSketch` in
+lib/sketches.py with exact ones from keeping every duration, for their error, time
+and size. Run from the repo root with `PYTHONPATH=. python benchmarks/sketches.py`.
+"""
+import argparse
+import sys
+import timeit
+
+import numpy as np
+
+from lib.sketches import DurationSketch
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+parser = argparse.ArgumentParser(
+    description="Times and checks the accuracy of sketching review durations"
+)
+parser.add_argument(
+    "-n", "--count", default=1000000, type=int, help="number of durations to sketch"
+)
+parser.add_argument(
+    "-p",
+    "--parts",
+    default=100,
+    type=int,
+    help="number of sketches to make and merge, like the days of a rollup",
+)
+parser.add_argument(
+    "-r", "--repeat", default=3, type=int, help="runs of each, keeping the fastest"
+)
+args = parser.parse_args()
+
+# Business durations in seconds, mostly minutes to hours with a long tail of days,
+#  and some reviewed out of hours taking none at all
+rng = np.random.default_rng(0)
+durations = rng.lognormal(mean=8, sigma=2, size=args.count)
+durations[rng.random(args.count) < 0.2] = 0
+parts = np.array_split(durations, args.parts)
+
+
+def get_exact():
+    return np.quantile(durations, PERCENTILES, method="lower")
+
+
+def get_sketched():
+    sketch = DurationSketch()
+    for part in parts:
+        part_sketch = DurationSketch()
+        part_sketch.add_many(part)
+        sketch.merge(part_sketch)
+    return sketch
+
+
+def time_function(function):
+    return min(timeit.repeat(function, number=1, repeat=args.repeat))
+
+
+exact = get_exact()
+sketch = get_sketched()
+for percentile, exact_value in zip(PERCENTILES, exact.tolist()):
+    value = sketch.quantile(percentile)
+    error = abs(value - exact_value) / exact_value if exact_value else value
+    print(
+        f"p{percentile * 100:<4g} exact {exact_value:14.1f}s sketched {value:14.1f}s"
+        f" error {error:7.3%}"
+    )
+print(
+    f"{'exact':<28} {time_function(get_exact):8.3f}s"
+    f" {durations.nbytes:>12,} bytes of durations"
+)
+print(
+    f"{'sketched and merged':<28} {time_function(get_sketched):8.3f}s"
+    f" {len(sketch.bins):>12,} bins, {sys.getsizeof(sketch.bins):,} bytes"
+)
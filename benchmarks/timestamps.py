@@ -0,0 +1,71 @@
+"""
+Compares timestamp parsing and timezone conversion in lib/timestamps.py with the
+general purpose functions the scripts used before. Run from the repo root with
+`PYTHONPATH=. python benchmarks/timestamps.py`.
+"""
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta, timezone
+
+import arrow
+from dateutil import parser as dateutil_parser
+
+from lib.timestamps import UtcOffsetCache, parse_timestamp
+
+parser = argparse.ArgumentParser(
+    description="Times parsing GitHub timestamps and converting them to a timezone"
+)
+parser.add_argument(
+    "-n", "--count", default=100000, type=int, help="number of timestamps to parse"
+)
+parser.add_argument("-tz", default="Europe/London", help="timezone to convert to")
+parser.add_argument(
+    "-r", "--repeat", default=3, type=int, help="runs of each, keeping the fastest"
+)
+args = parser.parse_args()
+
+random.seed(0)
+start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+timestamps = [
+    (start + timedelta(seconds=random.randrange(3 * 365 * 24 * 60 * 60))).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+    for _ in range(args.count)
+]
+utc_offsets = UtcOffsetCache(args.tz)
+
+# Each current function and what replaces it
+comparisons = [
+    (
+        ("dateutil.parser.parse", dateutil_parser.parse),
+        ("parse_timestamp", parse_timestamp),
+    ),
+    (
+        ("arrow.get(...).to(tz)", lambda timestamp: arrow.get(timestamp).to(args.tz)),
+        (
+            "parse_timestamp + to_local",
+            lambda timestamp: utc_offsets.to_local(parse_timestamp(timestamp)),
+        ),
+    ),
+]
+
+
+def time_function(function):
+    return min(
+        timeit.repeat(
+            lambda: [function(timestamp) for timestamp in timestamps],
+            number=1,
+            repeat=args.repeat,
+        )
+    )
+
+
+for (old_name, old_function), (new_name, new_function) in comparisons:
+    old_seconds = time_function(old_function)
+    new_seconds = time_function(new_function)
+    print(f"{old_name:<28} {old_seconds:8.3f}s {args.count / old_seconds:>12,.0f}/s")
+    print(
+        f"{new_name:<28} {new_seconds:8.3f}s {args.count / new_seconds:>12,.0f}/s"
+        f" {old_seconds / new_seconds:6.1f}x faster"
+    )
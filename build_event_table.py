@@ -0,0 +1,31 @@
+import argparse
+import os
+import sys
+
+from lib.events import EventTable
+from lib.raw_data import read_raw_data
+
+parser = argparse.ArgumentParser(
+    description="Flattens the output of download_data.py for every repo into a columnar table of timeline events"
+)
+parser.add_argument(
+    "-d",
+    "--data-dir",
+    default=os.path.join("data", "raw"),
+    help="directory holding the downloaded data of each repo",
+)
+parser.add_argument(
+    "-o",
+    "--output-file",
+    default=os.path.join("data", "events.npz"),
+    help="file to write the event table to",
+)
+args = parser.parse_args()
+
+table = EventTable.from_pull_requests(read_raw_data(args.data_dir))
+table.save(args.output_file)
+print(
+    f"Saved {table.event_count} events from {table.pr_count} pull requests"
+    f" in {len(table.repositories)} repositories to {args.output_file}",
+    file=sys.stderr,
+)
@@ -1,45 +1,19 @@
 import argparse
+import asyncio
 import os
-import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
+import arrow
 import requests
 
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    "--days-old",
-    "-d",
-    type=int,
-    default=14,
-    help="How many days old should the PRs be to be included in the downloaded set?",
-)
-parser.add_argument(
-    "--org",
-    type=str,
-    default="mpb-com",
-    help="Which org / user to download PR data from.",
-)
-parser.add_argument(
-    "--user",
-    type=str,
-    default=os.getenv("USER"),
-    help="Your github username that matches the $GH_API_TOKEN environment variable.",
-)
-args = parser.parse_args()
-
-user = args.user
-token = os.getenv("GH_API_TOKEN")
-
-# TODO: Handle pagination but most people / orgs don't have more than 200 repos.
-res = requests.get(
-    f"https://api.github.com/orgs/{args.org}/repos?per_page=200",
-    auth=(user, token),
-)
-res.raise_for_status()
-data = res.json()
+from lib.download_options import add_download_arguments
+from lib.github import *
+from lib.raw_data import *
+from lib.sync import *
 
 DATA_DIR = os.path.join("data", "raw")
-REPOSITORIES = [repo["name"] for repo in data]
 PRIMARY_REPOS = [
     'Flamingo',
     'Toucan',
@@ -50,24 +24,90 @@ PRIMARY_REPOS = [
     'pdf-rendering-service',
     'TranslationService',
 ]
-REPOSITORIES += PRIMARY_REPOS
-print(f"Repositories: {', '.join(REPOSITORIES)}")
 
-if not os.path.isdir(DATA_DIR):
-    os.makedirs(DATA_DIR)
 
-for repository in REPOSITORIES:
-    output_file = os.path.join(DATA_DIR, f"{repository}.json")
-    print("Loading PR data for", repository, "to", output_file)
-    subprocess.run(
-        [
-            sys.executable,
-            "./download_data.py",
-            "-o",
-            output_file,
-            "--days-old",
-            str(args.days_old),
-            "mpb-com",
-            repository,
+def get_repositories(org, user, token):
+    # TODO: Handle pagination but most people / orgs don't have more than 200 repos.
+    res = requests.get(
+        f"https://api.github.com/orgs/{org}/repos?per_page=200",
+        auth=(user, token),
+    )
+    res.raise_for_status()
+    repositories = [repo["name"] for repo in res.json()]
+    # Primary repos are usually in the org listing too, and must only be downloaded
+    #  once
+    return list(dict.fromkeys(repositories + PRIMARY_REPOS))
+
+
+async def download_repository(
+    args, session, semaphore, sync_state, repository, too_old
+):
+    extension = get_compression_extension(args.compress)
+    output_file = os.path.join(DATA_DIR, f"{repository}.{args.format}{extension}")
+    sync_key = get_sync_key(args.org, repository)
+    async with semaphore:
+        print("Loading PR data for", repository, "to", output_file)
+        try:
+            last_updated = await asyncio.to_thread(
+                sync_repository,
+                session,
+                args.org,
+                repository,
+                output_file=output_file,
+                last_synced=sync_state.get(sync_key) if args.incremental else None,
+                too_old=too_old,
+                jsonl=args.format == "jsonl",
+                resume=args.resume,
+            )
+        except (GitHubError, requests.RequestException) as e:
+            print(f"Failed to load PR data for {repository}: {e}", file=sys.stderr)
+            return
+    # A copy in another format would be read as a second repository by the reports
+    for filename in list_raw_files(DATA_DIR):
+        stale_file = os.path.join(DATA_DIR, filename)
+        if get_repository_name(filename) == repository and stale_file != output_file:
+            print("Removing", stale_file, "in favour of", output_file)
+            os.remove(stale_file)
+    # Only the event loop touches the sync state, so saving it here can't race
+    sync_state[sync_key] = last_updated
+    save_sync_state(args.state_file, sync_state)
+
+
+async def download_repositories(args, token, repositories):
+    # asyncio.to_thread runs on the default executor, which otherwise has at most
+    #  cpu_count + 4 threads however high the concurrency is set
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=args.concurrency)
+    )
+    session = create_session(token, pool_size=args.concurrency)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    sync_state = load_sync_state(args.state_file)
+    too_old = arrow.utcnow().to(args.tz).datetime - timedelta(days=args.days_old)
+    await asyncio.gather(
+        *[
+            download_repository(
+                args, session, semaphore, sync_state, repository, too_old
+            )
+            for repository in repositories
         ]
     )
+
+
+def download_all_data(args):
+    """
+    Downloads the PRs of every repository of `args.org`, and the primary ones, to
+    data/raw, with the options `add_download_arguments` added to `args`.
+    """
+    token = os.getenv("GH_API_TOKEN")
+    repositories = get_repositories(args.org, args.user, token)
+    print(f"Repositories: {', '.join(repositories)}")
+
+    if not os.path.isdir(DATA_DIR):
+        os.makedirs(DATA_DIR)
+    asyncio.run(download_repositories(args, token, repositories))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_download_arguments(parser)
+    download_all_data(parser.parse_args())
@@ -1,11 +1,13 @@
 import argparse
-import json
 import os
 import sys
 from datetime import timedelta
 
 import arrow
-import requests
+
+from lib.github import *
+from lib.profiling import add_profile_arguments, start_profiling
+from lib.sync import *
 
 parser = argparse.ArgumentParser(
     description="Downloads PR review data from GitHub for a given repo"
@@ -21,11 +23,19 @@ parser.add_argument(
 parser.add_argument(
     "--prs-per-batch",
     type=int,
-    help="the number of PRs to download per request",
+    help="the maximum number of PRs to download per request",
     default=100,
 )
 parser.add_argument(
-    "-o", "--output-file", help="file to output; if omitted uses stdout"
+    "-o",
+    "--output-file",
+    help="file to output, compressed when it ends in .gz or .zst; if omitted uses stdout",
+)
+parser.add_argument(
+    "--format",
+    choices=["json", "jsonl"],
+    default="json",
+    help="write a single JSON list, or one PR per line as soon as each page arrives",
 )
 parser.add_argument(
     "-tz",
@@ -39,9 +49,27 @@ parser.add_argument(
     default=14,
     help="How many days old should the PRs be to be included in the downloaded set?",
 )
+parser.add_argument(
+    "--incremental",
+    "-i",
+    action="store_true",
+    help="only download PRs updated since the last sync and merge them into the output file",
+)
+parser.add_argument(
+    "--state-file",
+    default=os.path.join("data", "sync_state.json"),
+    help="file recording the last sync point of each repo",
+)
+parser.add_argument(
+    "--resume",
+    "-r",
+    action="store_true",
+    help="carry on from the last complete page of an interrupted download to the same output file",
+)
+add_profile_arguments(parser)
 args = parser.parse_args()
+profiler = start_profiling("download_data.py", args)
 
-API_TOKEN_KEY = "GH_API_TOKEN"
 if not API_TOKEN_KEY in os.environ:
     print(
         f"There must be a '{API_TOKEN_KEY}' environment variable defined",
@@ -49,112 +77,32 @@ if not API_TOKEN_KEY in os.environ:
     )
     exit(1)
 
-token = os.environ[API_TOKEN_KEY]
-ENDPOINT = "https://api.github.com/graphql"
-HEADERS = {
-    "Authorization": f"Bearer {token}",
-    "Accept": "application/vnd.github.starfire-preview+json",
-}
-
-query = """
-query($repoOwner: String!, $repoName: String!, $prBefore: String, $prCount: Int = 100){
-  repository(owner: $repoOwner, name: $repoName) {
-    pullRequests(last: $prCount, before: $prBefore, orderBy: {field:CREATED_AT, direction:ASC}) {
-      pageInfo {
-        startCursor
-        hasPreviousPage
-      }
-      nodes {
-        title
-        createdAt
-        baseRepository { name }
-        author { login }
-        timelineItems(first: 200, itemTypes:[REVIEW_REQUESTED_EVENT, REVIEW_REQUEST_REMOVED_EVENT, PULL_REQUEST_REVIEW, CLOSED_EVENT, MERGED_EVENT]) {
-          nodes {
-            ... on ReviewRequestedEvent {
-              __typename
-              createdAt
-              requestedReviewer {
-                ...ReviewerInfo
-              }
-            }
-            ... on ReviewRequestRemovedEvent {
-              __typename
-              createdAt
-              requestedReviewer {
-                ...ReviewerInfo
-              }
-            }
-            ... on PullRequestReview {
-              __typename
-              state
-              submittedAt
-              author {
-                login
-              }
-            }
-            ... on ClosedEvent {
-              __typename
-              createdAt
-            }
-            ... on MergedEvent {
-              __typename
-              createdAt
-            }
-          }
-        }
-      }
-    }
-  }
-}
-
-fragment ReviewerInfo on RequestedReviewer {
-  ... on User {
-    login
-  }
-  ... on Team {
-    name
-  }
-}
-"""
-
-start_cursor = None
-has_previous_page = True
-all_nodes = []
+session = create_session(os.environ[API_TOKEN_KEY])
+sync_state = load_sync_state(args.state_file)
+sync_key = get_sync_key(args.repo_owner, args.repo_name)
+last_synced = sync_state.get(sync_key) if args.incremental else None
+if args.incremental and not last_synced:
+    print("No previous sync to continue from, downloading in full", file=sys.stderr)
 too_old = arrow.utcnow().to(args.tz).datetime - timedelta(days=args.days_old)
 
-while has_previous_page:
-    variables = dict(
-        repoOwner=args.repo_owner,
-        repoName=args.repo_name,
-        prBefore=start_cursor,
-        prCount=args.prs_per_batch,
-    )
-    data = json.dumps({"query": query, "variables": variables})
-
-    response = requests.post(ENDPOINT, headers=HEADERS, data=data)
-    response.raise_for_status()
-    result = response.json()
-
-    if "errors" in result:
-        print(result["errors"], file=sys.stderr)
-        exit(1)
-
-    pull_requests = result["data"]["repository"]["pullRequests"]
-    start_cursor = pull_requests["pageInfo"]["startCursor"]
-    has_previous_page = pull_requests["pageInfo"]["hasPreviousPage"]
-    nodes = pull_requests["nodes"]
-    if not nodes:
-        continue
-
-    all_nodes.extend(nodes)
-    pr = nodes[-1]
-    if arrow.get(pr["createdAt"]).to(args.tz).datetime < too_old:
-        has_previous_page = False
-
-    print(f"Loaded {len(all_nodes)} pull requests", file=sys.stderr)
-else:
-    print("Loaded all pull requests successfully", file=sys.stderr)
+try:
+    # GitHub's share of it is in the github_query stage
+    with profiler.stage("download"):
+        last_updated = sync_repository(
+            session,
+            args.repo_owner,
+            args.repo_name,
+            output_file=args.output_file,
+            last_synced=last_synced,
+            prs_per_batch=args.prs_per_batch,
+            too_old=too_old,
+            jsonl=args.format == "jsonl",
+            resume=args.resume,
+        )
+except GitHubError as e:
+    print(e, file=sys.stderr)
+    exit(1)
 
-output_file = open(args.output_file, "w") if args.output_file else sys.stdout
-output_file.write(json.dumps(all_nodes, indent=2) + "\n")
+if args.output_file:
+    sync_state[sync_key] = last_updated
+    save_sync_state(args.state_file, sync_state)
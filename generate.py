@@ -1,99 +1,149 @@
-import json
+import argparse
 import os
+from bisect import bisect_right
 from collections import defaultdict
 from copy import copy
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from datetime import datetime, time, timedelta, timezone
 from decimal import Decimal
-from typing import cast
+from typing import Optional, cast
 
+import numpy as np
 from businesstimedelta import LunchTimeRule, Rules, WorkDayRule
-from dateutil import parser
-from matplotlib import pylab
-
-
-def get_raw_data(primary_repos):
-    data_dir = os.path.join("data", "raw")
-    raw_data_files = [f for f in os.listdir(data_dir)]
-    raw_data_files = [f for f in raw_data_files if "transformed" not in f]
-    raw_data_files = [
-        f
-        for f in raw_data_files
-        if not primary_repos or f.replace(".json", "") in primary_repos
-    ]
-    raw_data = {
-        f.replace(".json", ""): json.load(open(os.path.join(data_dir, f)))
-        for f in raw_data_files
-    }
-    return raw_data
-
-
-@dataclass
-class Review:
-    index: int
-    reviewer: str
-    pull_request: str
-    repository: str
-    author: str
-    request: datetime
-    response: datetime
-    resolved: datetime
-    target_review_time: timedelta
-    working_hours: Rules
-
-    @property
-    def duration(self):
-        return self._calculate_duration_business_hours()
-
-    @property
-    def duration_string(self):
-        duration = self.duration
-        if self.duration:
-            duration = duration - timedelta(microseconds=duration.microseconds)
-        return str(duration)
-
-    def _calculate_duration_hours(self):
-        return self.response - self.request if self.response else None
 
-    def _calculate_duration_business_hours(self):
-        return (
-            self.working_hours.difference(self.request, self.response).timedelta
-            if self.response
-            else None
-        )
-
-    @property
-    def request_string(self):
-        return self.request.isoformat() if self.request else "N/A"
-
-    @property
-    def response_string(self):
-        return self.response.isoformat() if self.response else "N/A"
+from lib.business_time import get_business_durations
+from lib.charts import (
+    BarChart,
+    LineChart,
+    Series,
+    add_renderer_arguments,
+    get_renderer,
+)
+from lib.events import (
+    CLOSED,
+    MERGED,
+    NO_LOGIN,
+    PULL_REQUEST_REVIEW,
+    REVIEW_REQUESTED,
+    EventTable,
+    to_datetime,
+)
+from lib.profiling import add_profile_arguments, get_profiler, start_profiling
+from lib.raw_data import read_raw_data
+from lib.raw_store import RawStore
+from lib.rollups import ReviewCounts, ReviewRollups
+from lib.sketches import DurationSketch
+from lib.timestamps import parse_timestamp
+
+# The quantiles of review durations shown alongside the average
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def get_raw_data(primary_repos, since=None):
+    """
+    Maps each repository to an iterator over its PRs, which are only read from disk
+    as they are consumed. With `since`, PRs without any activity after it are skipped
+    as they're read.
+    """
+    return read_raw_data(os.path.join("data", "raw"), primary_repos, active_after=since)
+
+
+def get_rollup_settings(review_config, repositories):
+    """
+    Everything the per-day counts in `ReviewRollups` depend on, so changing any of it
+    means they're counted again. Run before any reviews are made, as looking up a
+    reviewer in WORKING_HOURS adds them to it.
+    """
+
+    def describe(rules):
+        return [
+            [type(rule).__name__, sorted((k, repr(v)) for k, v in vars(rule).items())]
+            for rule in rules.available_rules + rules.unavailable_rules
+        ]
 
-    @property
-    def resolved_string(self):
-        return self.resolved.isoformat() if self.resolved else "N/A"
+    return {
+        "target_review_time": review_config.target_review_time.total_seconds(),
+        "repositories": repositories,
+        "default_working_hours": describe(WORKING_HOURS.default_factory()),
+        "working_hours": {
+            reviewer: describe(rules) for reviewer, rules in WORKING_HOURS.items()
+        },
+        # The repository and author sketches only cover the expected reviewers
+        "github_names": GITHUB_NAMES,
+    }
 
-    @property
-    def is_actioned(self):
-        return bool(self.duration is not None)
 
-    @property
-    def is_actioned_within_target(self):
-        return bool(
-            self.duration < self.target_review_time if self.is_actioned else None
-        )
+class Review:
+    """
+    A single request for review and what came of it. Everything derived from it is
+    worked out once, in `set_duration` for the parts that depend on the business
+    hours duration, which ReviewFactory sets for all reviews at once.
+    """
+
+    __slots__ = (
+        "index",
+        "reviewer",
+        "pull_request",
+        "repository",
+        "author",
+        "request",
+        "response",
+        "resolved",
+        "target_review_time",
+        "working_hours",
+        "request_string",
+        "response_string",
+        "resolved_string",
+        "expects_review",
+        "expects_review_string",
+        "duration",
+        "duration_string",
+        "is_actioned",
+        "is_actioned_within_target",
+    )
 
-    @property
-    def expects_review(self):
+    def __init__(
+        self,
+        index: int,
+        reviewer: str,
+        pull_request: str,
+        repository: str,
+        author: str,
+        request: datetime,
+        response: Optional[datetime],
+        resolved: datetime,
+        target_review_time: timedelta,
+        working_hours: Rules,
+        duration: Optional[timedelta] = None,
+    ):
+        self.index = index
+        self.reviewer = reviewer
+        self.pull_request = pull_request
+        self.repository = repository
+        self.author = author
+        self.request = request
+        self.response = response
+        self.resolved = resolved
+        self.target_review_time = target_review_time
+        self.working_hours = working_hours
+
+        self.request_string = request.isoformat() if request else "N/A"
+        self.response_string = response.isoformat() if response else "N/A"
+        self.resolved_string = resolved.isoformat() if resolved else "N/A"
         # If a PR is merged or closed within the target review time, it counts as not
         #  expecting review
-        time_for_review = self.resolved - self.request
-        return time_for_review > self.target_review_time or self.response
-
-    @property
-    def expects_review_string(self):
-        return "   " if self.expects_review else "not"
+        time_for_review = resolved - request
+        self.expects_review = bool(time_for_review > target_review_time or response)
+        self.expects_review_string = "   " if self.expects_review else "not"
+        self.set_duration(duration)
+
+    def set_duration(self, duration):
+        self.duration = duration
+        self.duration_string = _format_duration(duration)
+        self.is_actioned = duration is not None
+        self.is_actioned_within_target = bool(
+            duration < self.target_review_time if self.is_actioned else None
+        )
 
     def __str__(self):
         index = format(self.index, f"<{STATS_CONFIG.max_index_len}")
@@ -120,83 +170,68 @@ class Review:
         )
 
 
-@dataclass
 class Reviewer:
-    name: str
-    full_name: str = field(init=False)
-    reviews: list[Review]
-
-    def __post_init__(self):
-        self.full_name = GITHUB_NAMES.get(self.name, self.name)
-
-    @property
-    def actioned_reviews(self):
-        return [review for review in self.reviews if review.is_actioned]
-
-    @property
-    def actioned_within_target_reviews(self):
-        return [review for review in self.reviews if review.is_actioned_within_target]
-
-    @property
-    def reviews_expect_review(self):
-        return [review for review in self.reviews if review.expects_review]
+    """
+    A reviewer and their reviews, with the counts, rates and average duration the
+    stats and graphs use worked out once up front. The counts and a `DurationSketch`
+    of the durations can be given instead, when they've been summed from
+    `ReviewRollups` without the reviews themselves.
+    """
+
+    __slots__ = (
+        "name",
+        "full_name",
+        "reviews",
+        "total_count",
+        "actioned_count",
+        "actioned_within_target_count",
+        "target_to_action_count",
+        "rate",
+        "rate_string",
+        "rate_with_target",
+        "rate_with_target_string",
+        "duration",
+        "duration_string",
+        "sketch",
+        "percentiles",
+        "percentiles_string",
+    )
 
-    @property
-    def rate(self):
-        return (
-            Decimal(self.actioned_count) / self.total_count
-            if self.total_count
-            else Decimal(0)
+    def __init__(
+        self,
+        name: str,
+        reviews: list[Review],
+        counts: Optional[ReviewCounts] = None,
+        sketch: Optional[DurationSketch] = None,
+    ):
+        self.name = name
+        self.full_name = GITHUB_NAMES.get(name, name)
+        self.reviews = reviews
+
+        if counts is None:
+            counts = _count_reviews(reviews)
+        self.total_count = counts.requested
+        self.actioned_count = counts.actioned
+        self.actioned_within_target_count = counts.actioned_within_target
+        self.target_to_action_count = counts.expected
+        total = timedelta(seconds=counts.duration_seconds)
+
+        self.rate = _get_rate(self.actioned_count, self.total_count)
+        self.rate_string = _format_percentage(self.actioned_count, self.total_count)
+        self.rate_with_target = _get_rate(
+            self.actioned_within_target_count, self.target_to_action_count
         )
-
-    @property
-    def rate_string(self):
-        rate_percentage = self.rate * 100
-        rate_percentage_rounded = rate_percentage.quantize(Decimal("0"))
-        return str(rate_percentage_rounded)
-
-    @property
-    def rate_with_target(self):
-        return (
-            Decimal(self.actioned_within_target_count) / self.target_to_action_count
-            if self.target_to_action_count
-            else Decimal(0)
+        self.rate_with_target_string = _format_percentage(
+            self.actioned_within_target_count, self.target_to_action_count
         )
+        self.duration = total / self.actioned_count if total else timedelta()
+        self.duration_string = _format_duration(self.duration)
 
-    @property
-    def rate_with_target_string(self):
-        rate_percentage = self.rate_with_target * 100
-        rate_percentage_rounded = rate_percentage.quantize(Decimal("0"))
-        return str(rate_percentage_rounded)
-
-    @property
-    def actioned_count(self):
-        return len(self.actioned_reviews)
-
-    @property
-    def actioned_within_target_count(self):
-        return len(self.actioned_within_target_reviews)
-
-    @property
-    def target_to_action_count(self):
-        return len([review for review in self.reviews_expect_review])
-
-    @property
-    def total_count(self):
-        return len(self.reviews)
-
-    @property
-    def duration(self):
-        durations = [review.duration for review in self.actioned_reviews]
-        total = sum(durations, timedelta())
-        return total / self.actioned_count if total else timedelta()
-
-    @property
-    def duration_string(self):
-        duration = self.duration
-        if self.duration:
-            duration = duration - timedelta(microseconds=duration.microseconds)
-        return str(duration)
+        if sketch is None:
+            sketch = _sketch_durations(reviews)
+        self.sketch = sketch
+        self.percentiles = _get_percentiles(sketch)
+        self.percentiles_string = _format_percentiles(self.percentiles)
 
     def __str__(self):
         reviewer = format(self.full_name, f"<{STATS_CONFIG.max_reviewer_len}")
@@ -217,23 +252,141 @@ class Reviewer:
         duration = format(
             self.duration_string, f">{STATS_CONFIG.max_reviewer_duration_len}"
         )
+        percentiles = format(
+            self.percentiles_string, f">{STATS_CONFIG.max_percentiles_len}"
+        )
         return (
             f"{reviewer} reviewed {actioned_count}/{total_count} ({rate}%),"
             f" with {actioned_within_target_count}/{target_to_action_count}"
             f" ({rate_with_target}%) hitting target,"
-            f" in on average {duration}"
+            f" in on average {duration}, p50/p90/p99 {percentiles}"
         )
 
 
+def _count_reviews(reviews):
+    requested = len(reviews)
+    actioned = 0
+    actioned_within_target = 0
+    expected = 0
+    duration_seconds = 0
+    for review in reviews:
+        if review.is_actioned:
+            actioned += 1
+            duration_seconds += int(review.duration.total_seconds())
+        if review.is_actioned_within_target:
+            actioned_within_target += 1
+        if review.expects_review:
+            expected += 1
+    return ReviewCounts(
+        requested, actioned, actioned_within_target, expected, duration_seconds
+    )
+
+
+def _sketch_durations(reviews):
+    sketch = DurationSketch()
+    sketch.add_many(
+        [review.duration.total_seconds() for review in reviews if review.is_actioned]
+    )
+    return sketch
+
+
+def _sketch_durations_by(reviews, get_name):
+    """
+    A `DurationSketch` of the actioned `reviews` for each name `get_name` gives them,
+    skipping those it gives None for.
+    """
+    durations = defaultdict(list)
+    for review in reviews:
+        name = get_name(review)
+        if review.is_actioned and name is not None:
+            durations[name].append(review.duration.total_seconds())
+    sketches = {}
+    for name, name_durations in durations.items():
+        sketches[name] = DurationSketch()
+        sketches[name].add_many(name_durations)
+    return sketches
+
+
+def _get_percentiles(sketch):
+    return [sketch.quantile(q) for q in PERCENTILES]
+
+
+def _format_percentiles(percentiles):
+    if percentiles[0] is None:
+        return "N/A"
+    return "/".join(
+        _format_duration(timedelta(seconds=round(percentile)))
+        for percentile in percentiles
+    )
+
+
+def _is_expected_reviewer(reviewer, expected_names):
+    full_name = GITHUB_NAMES.get(reviewer, reviewer)
+    return not GITHUB_NAMES or full_name in expected_names
+
+
+def _get_rate(count, total):
+    return Decimal(count) / total if total else Decimal(0)
+
+
+def _format_percentage(count, total):
+    """
+    `count / total` as a whole percentage, rounding halves to even like
+    `Decimal.quantize`, but in exact integer arithmetic.
+    """
+    if not total:
+        return "0"
+    percentage, remainder = divmod(count * 100, total)
+    if remainder * 2 > total or (remainder * 2 == total and percentage % 2):
+        percentage += 1
+    return str(percentage)
+
+
+def _get_first_after(times, after_times, default):
+    """
+    For each of the ascending `after_times`, the first of the ascending `times` that's
+    later than it, or `default` if there isn't one. As both are sorted this is one
+    pass over each.
+    """
+    firsts = []
+    i = 0
+    for after_time in after_times:
+        while i < len(times) and times[i] <= after_time:
+            i += 1
+        firsts.append(times[i] if i < len(times) else default)
+    return firsts
+
+
+def _format_duration(duration):
+    if duration:
+        duration = duration - timedelta(microseconds=duration.microseconds)
+    return str(duration)
+
+
 @dataclass
 class Reviews:
     reviewers: list[Reviewer]
+    # Sketches of the review durations on each repository's PRs, and each author's
+    repositories: dict[str, DurationSketch] = field(default_factory=dict)
+    authors: dict[str, DurationSketch] = field(default_factory=dict)
 
     def print_stats(self):
         self.finalise_formatting()
         # Stats per-reviewer
         for reviewer in self.reviewers:
             print(reviewer)
+        # Review time percentiles per-repository and per-author
+        for kind, sketches in [
+            ("Repository", self.repositories),
+            ("Author", self.authors),
+        ]:
+            name_len = max([len(name) for name in sketches], default=0)
+            for name, sketch in sorted(sketches.items()):
+                percentiles = _format_percentiles(_get_percentiles(sketch))
+                print(
+                    f"{kind} {name:<{name_len}} reviews took p50/p90/p99"
+                    f" {percentiles} over {sketch.count} reviews"
+                )
         # Stats per-pull-request
         # for reviewer in self.reviewers:
         #     for review in reviewer.reviews:
@@ -241,23 +394,33 @@ class Reviews:
 
     def finalise_formatting(self):
         reviews = [review for reviewer in self.reviewers for review in reviewer.reviews]
-        max_index_len = max([len(str(review.index)) for review in reviews])
-        max_pull_request_len = max([len(review.pull_request) for review in reviews])
-        max_repository_len = max([len(review.repository) for review in reviews])
-        max_author_len = max([len(review.author) for review in reviews])
+        max_index_len = max(
+            [len(str(review.index)) for review in reviews], default=0
+        )
+        max_pull_request_len = max(
+            [len(review.pull_request) for review in reviews], default=0
+        )
+        max_repository_len = max(
+            [len(review.repository) for review in reviews], default=0
+        )
+        max_author_len = max(
+            [len(review.author) for review in reviews], default=0
+        )
         max_date_len = max(
             [len(review.request_string) for review in reviews]
             + [len(review.response_string) for review in reviews]
-            + [len(review.resolved_string) for review in reviews]
+            + [len(review.resolved_string) for review in reviews],
+            default=0,
         )
         max_reviewer_duration_len = max(
             [len(reviewer.duration_string) for reviewer in self.reviewers]
         )
         max_review_duration_len = max(
-            [len(review.duration_string) for review in reviews]
+            [len(review.duration_string) for review in reviews], default=0
         )
         max_expectation_len = max(
-            [len(str(review.expects_review_string)) for review in reviews]
+            [len(str(review.expects_review_string)) for review in reviews],
+            default=0,
         )
 
         max_reviewer_len = max([len(reviewer.full_name) for reviewer in self.reviewers])
@@ -265,6 +428,9 @@ class Reviews:
             [len(str(reviewer.total_count)) for reviewer in self.reviewers]
         )
         max_rate_len = max([len(reviewer.rate_string) for reviewer in self.reviewers])
+        max_percentiles_len = max(
+            [len(reviewer.percentiles_string) for reviewer in self.reviewers]
+        )
 
         global STATS_CONFIG
         STATS_CONFIG = StatsConfig(
@@ -279,9 +445,34 @@ class Reviews:
             max_count_len=max_count_len,
             max_rate_len=max_rate_len,
             max_expectation_len=max_expectation_len,
+            max_percentiles_len=max_percentiles_len,
         )
 
 
+@dataclass
+class ReviewTrend:
+    """
+    The stats of each reviewer in each of a series of windows, with `reviewers`
+    holding a `Reviewer` per window in the same order as `windows`.
+    """
+
+    windows: list["ReviewConfig"]
+    reviewers: dict[str, list[Reviewer]]
+
+    def print_stats(self):
+        Reviews(
+            [reviewer for trend in self.reviewers.values() for reviewer in trend]
+        ).finalise_formatting()
+        for i, window in enumerate(self.windows):
+            # As in a single window, only reviewers with requests in it are shown
+            reviewers = [
+                trend[i] for trend in self.reviewers.values() if trend[i].total_count
+            ]
+            reviewers.sort(key=lambda reviewer: reviewer.rate_with_target * -1)
+            for reviewer in reviewers:
+                print(window.end.date(), reviewer)
+
+
 @dataclass(frozen=True)
 class ReviewConfig:
     duration: timedelta
@@ -293,6 +484,18 @@ class ReviewConfig:
         return self.end - self.duration
 
 
+def get_trend_windows(review_config, step, count):
+    """
+    `count` windows as long as `review_config`'s, oldest first, with the last ending
+    where it does and each ending `step` after the one before. They slide when `step`
+    is shorter than the window, and tumble when it's the same.
+    """
+    return [
+        replace(review_config, end=review_config.end - step * i)
+        for i in reversed(range(count))
+    ]
+
+
 @dataclass(frozen=True)
 class StatsConfig:
     max_index_len: int
@@ -306,6 +509,7 @@ class StatsConfig:
     max_count_len: int
     max_rate_len: int
     max_expectation_len: int
+    max_percentiles_len: int
 
 
 STATS_CONFIG: StatsConfig = cast(StatsConfig, None)
@@ -313,36 +517,289 @@ STATS_CONFIG: StatsConfig = cast(StatsConfig, None)
 
 # noinspection PyMethodMayBeStatic
 class ReviewFactory:
-    def __init__(self, review_config):
+    def __init__(
+        self, review_config, rollups=None, settle_days=7, trend_windows=None
+    ):
         self.review_config = review_config
+        # With `ReviewRollups`, the stats are summed from per-day counts, and only the
+        #  days that could still change are counted from the reviews again. A day can
+        #  change until it's `settle_days` old.
+        self.rollups = rollups
+        self.settle_days = settle_days
+        # With `trend_windows`, from `get_trend_windows`, a `ReviewTrend` is made of
+        #  the reviews instead. `review_config` should then span all the windows.
+        self.trend_windows = trend_windows
 
     def create(self, raw_data):
-        return self._get_reviewers(raw_data)
-
-    def _get_reviewers(self, repositories):
-        reviews = self._get_reviews(repositories)
-        reviews = [
-            review for review in reviews if review.request > self.review_config.start
+        # The raw data is read as the reviews are matched
+        with get_profiler().stage("read_and_match") as stage:
+            reviews = self._get_reviews(raw_data)
+            stage.items += len(reviews)
+        with get_profiler().stage("aggregate"):
+            return self._get_reviewers(reviews)
+
+    def create_from_events(self, events, repositories=None):
+        """
+        Same as `create`, but reads the PRs from an `EventTable` rather than raw data.
+        """
+        with get_profiler().stage("match") as stage:
+            reviews = self._get_reviews_from_events(events, repositories)
+            stage.items += len(reviews)
+        with get_profiler().stage("aggregate"):
+            return self._get_reviewers(reviews)
+
+    def _get_reviewers(self, reviews):
+        if self.trend_windows:
+            return self._get_trend(reviews)
+        if self.rollups:
+            return self._get_reviewers_from_rollups(reviews)
+        # One pass keeps the reviews in the window by expected users, grouping them by
+        #  reviewer, and the actioned ones by working hours to work out durations
+        reviews_by_reviewer = defaultdict(list)
+        actioned_reviews_by_working_hours = defaultdict(list)
+        expected_names = set(GITHUB_NAMES.values())
+        is_expected = {}
+        for review in reviews:
+            if review.request <= self.review_config.start:
+                continue
+            if review.reviewer not in is_expected:
+                is_expected[review.reviewer] = _is_expected_reviewer(
+                    review.reviewer, expected_names
+                )
+            # Exclude unexpected users
+            if not is_expected[review.reviewer]:
+                continue
+            reviews_by_reviewer[review.reviewer].append(review)
+            if review.response:
+                working_hours = id(review.working_hours)
+                actioned_reviews_by_working_hours[working_hours].append(review)
+
+        for actioned_reviews in actioned_reviews_by_working_hours.values():
+            self._set_business_durations(actioned_reviews)
+        reviewers = [
+            Reviewer(name=reviewer, reviews=reviewer_reviews)
+            for reviewer, reviewer_reviews in reviews_by_reviewer.items()
+        ]
+        # Sort in decending order by reviews meeting the target
+        reviewers.sort(key=lambda reviewer: reviewer.rate_with_target * -1)
+        kept_reviews = [
+            review
+            for reviewer_reviews in reviews_by_reviewer.values()
+            for review in reviewer_reviews
         ]
-        reviewer_names = {review.reviewer for review in reviews}
+        return Reviews(
+            reviewers,
+            repositories=_sketch_durations_by(
+                kept_reviews, lambda review: review.repository
+            ),
+            authors=_sketch_durations_by(kept_reviews, lambda review: review.author),
+        )
+
+    def get_recount_start(self):
+        """
+        The start of the first day `ReviewRollups` need counted again, so PRs without
+        any activity since then can be skipped as the raw data is read, or the start
+        of the window if they're not used.
+        """
+        if not self.rollups or self.trend_windows:
+            return self.review_config.start
+        # The current day is always counted again, as it hasn't ended
+        first_day = min(self._get_days_to_count())
+        return datetime.combine(first_day, time(), timezone.utc)
+
+    def _get_days_to_count(self):
+        # The window is made of whole UTC days, ending with the current one
+        first_day = (self.review_config.start + timedelta(days=1)).date()
+        last_day = self.review_config.end.date()
+        settled_day = last_day - timedelta(days=self.settle_days)
+        counted_days = self.rollups.get_days(first_day, last_day)
+        days = set()
+        day = first_day
+        while day <= last_day:
+            counted_at, _ = counted_days.get(day, (None, None))
+            day_end = datetime.combine(day + timedelta(days=1), time(), timezone.utc)
+            # Only days counted after they ended that have settled are left as they
+            #  are, as reviews can still be actioned, or PRs arrive late, until then
+            if (
+                counted_at is None
+                or counted_at < day_end.timestamp()
+                or day > settled_day
+            ):
+                days.add(day)
+            day += timedelta(days=1)
+        return days
+
+    def _get_reviewers_from_rollups(self, reviews):
+        end = self.review_config.end
+        first_day = (self.review_config.start + timedelta(days=1)).date()
+        last_day = end.date()
+        days = self._get_days_to_count()
+
+        reviews_by_day_and_reviewer = defaultdict(list)
+        actioned_reviews_by_working_hours = defaultdict(list)
+        for review in reviews:
+            day = review.request.astimezone(timezone.utc).date()
+            if day not in days:
+                continue
+            reviews_by_day_and_reviewer[day, review.reviewer].append(review)
+            if review.response:
+                working_hours = id(review.working_hours)
+                actioned_reviews_by_working_hours[working_hours].append(review)
+        for actioned_reviews in actioned_reviews_by_working_hours.values():
+            self._set_business_durations(actioned_reviews)
+        # Reviewers' sketches are kept for everyone, like their counts, but those of
+        #  repositories and authors only cover the expected reviewers
+        expected_names = set(GITHUB_NAMES.values())
+        sketches = {}
+        for (day, reviewer), day_reviews in reviews_by_day_and_reviewer.items():
+            sketches[day, "reviewer", reviewer] = _sketch_durations(day_reviews)
+        expected_reviews_by_day = defaultdict(list)
+        for (day, reviewer), day_reviews in reviews_by_day_and_reviewer.items():
+            if _is_expected_reviewer(reviewer, expected_names):
+                expected_reviews_by_day[day].extend(day_reviews)
+        for day, day_reviews in expected_reviews_by_day.items():
+            for kind, get_name in [
+                ("repository", lambda review: review.repository),
+                ("author", lambda review: review.author),
+            ]:
+                for name, sketch in _sketch_durations_by(day_reviews, get_name).items():
+                    sketches[day, kind, name] = sketch
+        self.rollups.put_days(
+            sorted(days),
+            {
+                key: _count_reviews(day_reviews)
+                for key, day_reviews in reviews_by_day_and_reviewer.items()
+            },
+            end.timestamp(),
+            sketches,
+        )
+
+        sketches = self.rollups.get_sketches(first_day, last_day)
         reviewers = [
             Reviewer(
                 name=reviewer,
-                reviews=[review for review in reviews if review.reviewer == reviewer],
+                reviews=[],
+                counts=counts,
+                sketch=sketches["reviewer"].get(reviewer, DurationSketch()),
             )
-            for reviewer in reviewer_names
+            for reviewer, counts in self.rollups.get_totals(
+                first_day, last_day
+            ).items()
+            if _is_expected_reviewer(reviewer, expected_names)
         ]
-        # Sort in decending order by reviews meeting the target
-        reviewers = sorted(
-            reviewers, key=lambda reviewer: reviewer.rate_with_target * -1
+        reviewers.sort(key=lambda reviewer: reviewer.rate_with_target * -1)
+        return Reviews(
+            reviewers,
+            repositories=sketches["repository"],
+            authors=sketches["author"],
         )
-        # Exclude unexpected users
-        reviewers = [
-            reviewer
-            for reviewer in reviewers
-            if not GITHUB_NAMES or reviewer.full_name in GITHUB_NAMES.values()
-        ]
-        return Reviews(reviewers)
+
+    def _get_trend(self, reviews):
+        # Each review's duration doesn't depend on the window, so the reviews are
+        #  worked out once, and then each window's counts are differences of running
+        #  totals over the reviews in order of request
+        reviews_by_reviewer = defaultdict(list)
+        actioned_reviews_by_working_hours = defaultdict(list)
+        expected_names = set(GITHUB_NAMES.values())
+        for review in reviews:
+            if review.request <= self.review_config.start:
+                continue
+            if not _is_expected_reviewer(review.reviewer, expected_names):
+                continue
+            reviews_by_reviewer[review.reviewer].append(review)
+            if review.response:
+                working_hours = id(review.working_hours)
+                actioned_reviews_by_working_hours[working_hours].append(review)
+        for actioned_reviews in actioned_reviews_by_working_hours.values():
+            self._set_business_durations(actioned_reviews)
+
+        windows = self.trend_windows
+        starts = np.array([window.start.timestamp() for window in windows])
+        ends = np.array([window.end.timestamp() for window in windows])
+        # A review that's neither actioned nor resolved is expected in a window once
+        #  the target review time has passed by the end of it
+        open_until = ends - self.review_config.target_review_time.total_seconds()
+        trend = {}
+        for reviewer, reviewer_reviews in reviews_by_reviewer.items():
+            reviewer_reviews.sort(key=lambda review: review.request)
+            requests = np.array(
+                [review.request.timestamp() for review in reviewer_reviews]
+            )
+            firsts = np.searchsorted(requests, starts, side="right")
+            lasts = np.searchsorted(requests, ends, side="right")
+
+            def count(values):
+                totals = np.zeros(len(values) + 1, dtype=np.int64)
+                np.cumsum(values, out=totals[1:])
+                return (totals[lasts] - totals[firsts]).tolist()
+
+            # Unresolved reviews are resolved at the end of `review_config`
+            is_open = np.array(
+                [
+                    review.response is None
+                    and review.resolved is self.review_config.end
+                    for review in reviewer_reviews
+                ]
+            )
+            open_requests = requests[is_open]
+            open_expected = np.maximum(
+                np.searchsorted(open_requests, open_until, side="left")
+                - np.searchsorted(open_requests, starts, side="right"),
+                0,
+            )
+            expected = np.array(
+                [review.expects_review for review in reviewer_reviews]
+            )
+            counts = zip(
+                (lasts - firsts).tolist(),
+                count([review.is_actioned for review in reviewer_reviews]),
+                count(
+                    [review.is_actioned_within_target for review in reviewer_reviews]
+                ),
+                (np.array(count(expected & ~is_open)) + open_expected).tolist(),
+                count(
+                    [
+                        int(review.duration.total_seconds()) if review.duration else 0
+                        for review in reviewer_reviews
+                    ]
+                ),
+            )
+            # Sketches can't be subtracted like counts, so each window's is made
+            #  from its own durations
+            durations = np.array(
+                [
+                    review.duration.total_seconds() if review.is_actioned else np.nan
+                    for review in reviewer_reviews
+                ]
+            )
+            sketches = []
+            for first, last in zip(firsts.tolist(), lasts.tolist()):
+                window_durations = durations[first:last]
+                sketch = DurationSketch()
+                sketch.add_many(window_durations[~np.isnan(window_durations)])
+                sketches.append(sketch)
+            trend[reviewer] = [
+                Reviewer(
+                    name=reviewer,
+                    reviews=[],
+                    counts=ReviewCounts(*window_counts),
+                    sketch=sketch,
+                )
+                for window_counts, sketch in zip(counts, sketches)
+            ]
+        return ReviewTrend(windows, trend)
+
+    def _set_business_durations(self, reviews):
+        # Reviews sharing working hours have their durations worked out together
+        with get_profiler().stage("business_durations") as stage:
+            durations = get_business_durations(
+                reviews[0].working_hours,
+                [review.request for review in reviews],
+                [review.response for review in reviews],
+            )
+            stage.items += len(reviews)
+        for review, duration in zip(reviews, durations.tolist()):
+            review.set_duration(timedelta(seconds=duration))
 
     def _get_reviews(self, repositories):
         reviews = []
@@ -358,10 +815,44 @@ class ReviewFactory:
             reviews.extend(self._get_reviews_for_pr(pr, repository_name))
         return reviews
 
-    def _get_reviews_for_pr(self, pr, repository_name):
+    def _get_reviews_from_events(self, events, repositories):
         reviews = []
-        title = pr["title"]
-        author = pr["author"]["login"]
+        event_types = events.event_type.tolist()
+        event_logins = events.event_login.tolist()
+        event_times = events.event_time.tolist()
+        start = int(self.review_config.start.timestamp())
+        event_pr = np.repeat(np.arange(events.pr_count), np.diff(events.event_offsets))
+        active_prs = np.unique(event_pr[events.event_time > start]).tolist()
+        for i in active_prs:
+            repository_name = events.repositories[events.pr_repository[i]]
+            if repositories and repository_name not in repositories:
+                continue
+            pr_review_requests = {}
+            pr_reviews = {}
+            pr_resolutions = set()
+            for j in range(events.event_offsets[i], events.event_offsets[i + 1]):
+                event_type, login = event_types[j], event_logins[j]
+                if event_type == REVIEW_REQUESTED and login != NO_LOGIN:
+                    times = pr_review_requests.setdefault(events.logins[login], set())
+                    times.add(to_datetime(event_times[j]))
+                elif event_type == PULL_REQUEST_REVIEW and login != NO_LOGIN:
+                    times = pr_reviews.setdefault(events.logins[login], set())
+                    times.add(to_datetime(event_times[j]))
+                elif event_type in {CLOSED, MERGED}:
+                    pr_resolutions.add(to_datetime(event_times[j]))
+            reviews.extend(
+                self._get_reviews_for_timeline(
+                    pr_review_requests,
+                    pr_reviews,
+                    sorted(pr_resolutions),
+                    title=events.titles[i],
+                    repository_name=repository_name,
+                    author=events.get_login(events.pr_author[i]),
+                )
+            )
+        return reviews
+
+    def _get_reviews_for_pr(self, pr, repository_name):
         (
             pr_review_requests,
             pr_reviews,
@@ -369,7 +860,25 @@ class ReviewFactory:
         ) = self._get_pr_review_requests_and_reviews(
             pr,
         )
+        return self._get_reviews_for_timeline(
+            pr_review_requests,
+            pr_reviews,
+            pr_resolutions,
+            title=pr["title"],
+            repository_name=repository_name,
+            author=pr["author"]["login"],
+        )
 
+    def _get_reviews_for_timeline(
+        self,
+        pr_review_requests,
+        pr_reviews,
+        pr_resolutions,
+        title,
+        repository_name,
+        author,
+    ):
+        reviews = []
         reviewers = set(pr_review_requests).union(pr_reviews)
         for reviewer in reviewers:
             reviews.extend(
@@ -397,19 +906,23 @@ class ReviewFactory:
     ):
         reviews = []
         reviewer_requests = sorted(pr_review_requests.get(reviewer, set()))
+        # Requests from before the window aren't made into reviews, but still count
+        #  towards the index of those after them
+        earlier_request_count = bisect_right(
+            reviewer_requests, self.review_config.start
+        )
+        reviewer_requests = reviewer_requests[earlier_request_count:]
         reviewer_reviews = sorted(pr_reviews.get(reviewer, set()))
-        for i, request in enumerate(reviewer_requests):
-            response = next(
-                iter([response for response in reviewer_reviews if response > request]),
-                None,
-            )
-            resolution = next(
-                iter([resolved for resolved in pr_resolutions if resolved > request]),
-                self.review_config.end,
-            )
+        responses = _get_first_after(reviewer_reviews, reviewer_requests, None)
+        resolutions = _get_first_after(
+            pr_resolutions, reviewer_requests, self.review_config.end
+        )
+        for i, (request, response, resolution) in enumerate(
+            zip(reviewer_requests, responses, resolutions)
+        ):
             reviews.append(
                 Review(
-                    index=i + 1,
+                    index=earlier_request_count + i + 1,
                     reviewer=reviewer,
                     pull_request=title,
                     repository=repository_name,
@@ -439,7 +952,7 @@ class ReviewFactory:
                     or "login" not in event["requestedReviewer"]
                 ):
                     continue
-                created = parser.parse(event["createdAt"])
+                created = parse_timestamp(event["createdAt"])
                 times = pr_review_requests.setdefault(
                     event["requestedReviewer"]["login"], set()
                 )
@@ -453,7 +966,7 @@ class ReviewFactory:
             if event["__typename"] == "PullRequestReview":
                 if "login" not in event["author"]:
                     continue
-                submitted = parser.parse(event["submittedAt"])
+                submitted = parse_timestamp(event["submittedAt"])
                 times = pr_reviews.setdefault(event["author"]["login"], set())
                 times.add(submitted)
         return pr_reviews
@@ -463,17 +976,24 @@ class ReviewFactory:
         pr_resolutions = set()
         for event in events:
             if event["__typename"] in {"MergedEvent", "ClosedEvent"}:
-                submitted = parser.parse(event["createdAt"])
+                submitted = parse_timestamp(event["createdAt"])
                 pr_resolutions.add(submitted)
         return sorted(pr_resolutions)
 
 
 # noinspection PyMethodMayBeStatic
 class ReviewGrapher:
+    def __init__(self, renderer):
+        self.renderer = renderer
+
     def graph(self, reviews):
         self._graph_reviews_by_reviewer(reviews)
         self._graph_rate_by_reviewer(reviews)
         self._graph_time_by_reviewer(reviews)
+        self._graph_percentiles_by_reviewer(reviews)
+
+    def _render(self, chart, name):
+        self.renderer.render(chart, f"output/{name}.{self.renderer.extension}")
 
     def _graph_reviews_by_reviewer(self, reviews):
         """
@@ -494,35 +1014,22 @@ class ReviewGrapher:
         fail = [reviewer.target_to_action_count for reviewer in reviewers]
         slow_difference = [item[1] - item[0] for item in zip(success, slow)]
         fail_difference = [item[2] - item[1] for item in zip(success, slow, fail)]
-        pylab.clf()
-        pylab.figure(figsize=(10, 15))
-        pylab.bar(
-            labels,
-            success,
-            label="Reviewed within target",
-            color="green",
-        )
-        pylab.bar(
-            labels,
-            slow_difference,
-            bottom=success,
-            label="Reviewed slower than target",
-            color="orange",
-        )
-        pylab.bar(
-            labels,
-            fail_difference,
-            bottom=slow,
-            label="Not reviewed",
-            color="red",
-        )
-        pylab.xticks(rotation=90)
-        pylab.yticks(ticks=[0, 20, 40, 60, 80, 100, 120])
-        pylab.legend()
-        pylab.ylabel("Number of code reviews")
-        pylab.title("Code reviews actioned")
-        pylab.grid(True)
-        pylab.savefig("output/reviews_by_reviewer.png")
+        chart = BarChart(
+            title="Code reviews actioned",
+            categories=labels,
+            series=[
+                Series(success, label="Reviewed within target", color="green"),
+                Series(
+                    slow_difference, label="Reviewed slower than target", color="orange"
+                ),
+                Series(fail_difference, label="Not reviewed", color="red"),
+            ],
+            stacked=True,
+            y_label="Number of code reviews",
+            y_ticks=[0, 20, 40, 60, 80, 100, 120],
+            size=(10, 15),
+        )
+        self._render(chart, "reviews_by_reviewer")
 
     def _graph_rate_by_reviewer(self, reviews):
         """
@@ -533,19 +1040,16 @@ class ReviewGrapher:
             for reviewer in reviews.reviewers
         ]
         data = list(reversed(sorted(data, key=lambda item: item[1])))
-        pylab.clf()
-        pylab.figure(figsize=(10, 10))
-        pylab.bar(*list(zip(*data)))
-        pylab.ylim([0, 1])
-        pylab.xticks(rotation=90)
-        pylab.yticks(
-            ticks=[0, 0.2, 0.4, 0.6, 0.8, 1],
-            labels=["0", "20%", "40%", "60%", "80%", "100%"],
-        )
-        pylab.ylabel("Pull requests reviewed within half a business day / %")
-        pylab.title("Reviews responded to by reviewer (target is 100%)")
-        pylab.grid(True)
-        pylab.savefig("output/rate_by_reviewer.png")
+        chart = BarChart(
+            title="Reviews responded to by reviewer (target is 100%)",
+            categories=[name for name, _ in data],
+            series=[Series([rate for _, rate in data])],
+            y_label="Pull requests reviewed within half a business day / %",
+            y_range=(0, 1),
+            y_ticks=[0, 0.2, 0.4, 0.6, 0.8, 1],
+            percent=True,
+        )
+        self._render(chart, "rate_by_reviewer")
 
     def _graph_time_by_reviewer(self, reviews):
         """
@@ -561,17 +1065,102 @@ class ReviewGrapher:
             for reviewer in reviews.reviewers
         ]
         data = list(sorted(data, key=lambda item: item[1]))
-        pylab.clf()
-        pylab.figure(figsize=(10, 10))
-        pylab.bar(*list(zip(*data)))
-        pylab.xticks(rotation=90)
-        pylab.ylabel("Average time to review a pull request / working hours")
-        pylab.title("Review time by reviewer (target is 3.5 hours)")
-        pylab.grid(True)
-        pylab.savefig("output/time_by_reviewer.png")
+        chart = BarChart(
+            title="Review time by reviewer (target is 3.5 hours)",
+            categories=[name for name, _ in data],
+            series=[Series([hours for _, hours in data])],
+            y_label="Average time to review a pull request / working hours",
+        )
+        self._render(chart, "time_by_reviewer")
+
+    def _graph_percentiles_by_reviewer(self, reviews):
+        """
+        Review time percentiles by reviewer, for those who actioned any reviews.
+        """
+        reviewers = [
+            reviewer for reviewer in reviews.reviewers if reviewer.actioned_count
+        ]
+        reviewers.sort(key=lambda reviewer: reviewer.percentiles[1])
+        chart = BarChart(
+            title="Review time percentiles by reviewer (target is 3.5 hours)",
+            categories=[reviewer.full_name for reviewer in reviewers],
+            series=[
+                Series(
+                    [reviewer.percentiles[i] / 60 / 60 for reviewer in reviewers],
+                    label=f"p{percentile * 100:g}",
+                )
+                for i, percentile in enumerate(PERCENTILES)
+            ],
+            y_label="Time to review a pull request / working hours",
+        )
+        self._render(chart, "percentiles_by_reviewer")
+
+    def graph_trend(self, trend):
+        self._graph_trend_rate_by_reviewer(trend)
+        self._graph_trend_time_by_reviewer(trend)
+
+    def _graph_trend_rate_by_reviewer(self, trend):
+        """
+        Review success rate by reviewer, for each window of a trend. Windows where
+        nothing was expected of a reviewer are left as gaps.
+        """
+        chart = LineChart(
+            title="Reviews responded to by reviewer over time (target is 100%)",
+            x=[window.end for window in trend.windows],
+            series=[
+                Series(
+                    [
+                        float(reviewer.rate_with_target)
+                        if reviewer.target_to_action_count
+                        else float("nan")
+                        for reviewer in reviewers
+                    ],
+                    label=reviewers[0].full_name,
+                )
+                for reviewers in trend.reviewers.values()
+            ],
+            x_label="End of window",
+            y_label="Pull requests reviewed within half a business day / %",
+            y_range=(0, 1),
+            y_ticks=[0, 0.2, 0.4, 0.6, 0.8, 1],
+            percent=True,
+        )
+        self._render(chart, "trend_rate_by_reviewer")
+
+    def _graph_trend_time_by_reviewer(self, trend):
+        """
+        Review time by reviewer, for each window of a trend. Windows where a reviewer
+        didn't action anything are left as gaps.
+        """
+        chart = LineChart(
+            title="Review time by reviewer over time (target is 3.5 hours)",
+            x=[window.end for window in trend.windows],
+            series=[
+                Series(
+                    [
+                        reviewer.duration.total_seconds() / 60 / 60
+                        if reviewer.actioned_count
+                        else float("nan")
+                        for reviewer in reviewers
+                    ],
+                    label=reviewers[0].full_name,
+                )
+                for reviewers in trend.reviewers.values()
+            ],
+            x_label="End of window",
+            y_label="Average time to review a pull request / working hours",
+        )
+        self._render(chart, "trend_time_by_reviewer")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Works out and graphs review stats for the reviewers set up below"
+    )
+    add_renderer_arguments(parser)
+    add_profile_arguments(parser)
+    ARGS = parser.parse_args()
+    PROFILER = start_profiling("generate.py", ARGS)
     # The data is averaged over the last four weeks.
     # Time is measured in working hours. Nights and weekends are excluded.
     # Working hours for part-timers only include days they work.
@@ -604,6 +1193,26 @@ if __name__ == "__main__":
         "chazmead": "Chaz",
         "harry-adams": "Harry",
     }
+    # Read the PRs from the table written by build_event_table.py instead of data/raw
+    USE_EVENT_TABLE = False
+    EVENT_TABLE_FILE = os.path.join("data", "events.npz")
+    # Or read only the PRs with activity in the window from the store written by
+    #  import_raw_data.py
+    USE_RAW_STORE = False
+    RAW_STORE_FILE = os.path.join("data", "raw.sqlite")
+    # Keep per-reviewer daily counts, so only the days that can still change are
+    #  worked out again on each run
+    USE_ROLLUPS = False
+    ROLLUP_FILE = os.path.join("data", "rollups.sqlite")
+    # Days are counted again until they're this many days old, as their reviews can
+    #  still be actioned, and PRs downloaded late, until then
+    SETTLE_DAYS = 7
+    # Work out the stats for a series of windows ending a step apart, ending with the
+    #  usual one, and graph how they've changed. Steps shorter than the window make
+    #  them overlap.
+    TREND_MODE = False
+    TREND_STEP = timedelta(weeks=1)
+    TREND_WINDOW_COUNT = 52
     INCLUDE_ALL_USERS = False
     GITHUB_NAMES = {} if INCLUDE_ALL_USERS else GITHUB_NAMES
     DEFAULT_WORKING_HOURS_RULES = Rules(
@@ -651,13 +1260,57 @@ if __name__ == "__main__":
             ],
         ),
     )
-    RAW_DATA = get_raw_data(None if INCLUDE_ALL_REPOS else PRIMARY_REPOS)
+    REPOSITORIES = None if INCLUDE_ALL_REPOS else PRIMARY_REPOS
     REVIEW_CONFIG: ReviewConfig = ReviewConfig(
         duration=timedelta(weeks=4),
         end=datetime.now().replace(tzinfo=timezone.utc),
         target_review_time=timedelta(hours=3, minutes=30),
     )
-    REVIEW_FACTORY = ReviewFactory(REVIEW_CONFIG)
-    REVIEWS = REVIEW_FACTORY.create(RAW_DATA)
-    REVIEWS.print_stats()
-    ReviewGrapher().graph(REVIEWS)
+    TREND_WINDOWS = None
+    if TREND_MODE:
+        TREND_WINDOWS = get_trend_windows(
+            REVIEW_CONFIG, TREND_STEP, TREND_WINDOW_COUNT
+        )
+        # The reviews of every window are read in one go
+        REVIEW_CONFIG = replace(
+            REVIEW_CONFIG, duration=REVIEW_CONFIG.end - TREND_WINDOWS[0].start
+        )
+    ROLLUPS = (
+        ReviewRollups(ROLLUP_FILE, get_rollup_settings(REVIEW_CONFIG, REPOSITORIES))
+        if USE_ROLLUPS and not TREND_MODE
+        else None
+    )
+    REVIEW_FACTORY = ReviewFactory(
+        REVIEW_CONFIG, ROLLUPS, SETTLE_DAYS, trend_windows=TREND_WINDOWS
+    )
+    if USE_EVENT_TABLE:
+        with PROFILER.stage("read") as STAGE:
+            EVENTS = EventTable.load(EVENT_TABLE_FILE)
+            STAGE.items += EVENTS.pr_count
+        REVIEWS = REVIEW_FACTORY.create_from_events(EVENTS, REPOSITORIES)
+    elif USE_RAW_STORE:
+        with PROFILER.stage("read") as STAGE:
+            RAW_STORE = RawStore(RAW_STORE_FILE)
+            EVENTS = RAW_STORE.load_events(
+                repositories=REPOSITORIES,
+                # Expected users may be listed by login or by name
+                reviewers=set(GITHUB_NAMES).union(GITHUB_NAMES.values()) or None,
+                since=REVIEW_CONFIG.start,
+            )
+            RAW_STORE.close()
+            STAGE.items += EVENTS.pr_count
+        REVIEWS = REVIEW_FACTORY.create_from_events(EVENTS)
+    else:
+        # With rollups, only the PRs with activity on the days counted again are read
+        RAW_DATA = get_raw_data(REPOSITORIES, REVIEW_FACTORY.get_recount_start())
+        REVIEWS = REVIEW_FACTORY.create(RAW_DATA)
+    if ROLLUPS:
+        ROLLUPS.close()
+    with PROFILER.stage("print_stats"):
+        REVIEWS.print_stats()
+    with PROFILER.stage("graph"):
+        GRAPHER = ReviewGrapher(get_renderer(ARGS.renderer))
+        if TREND_MODE:
+            GRAPHER.graph_trend(REVIEWS)
+        else:
+            GRAPHER.graph(REVIEWS)
@@ -1,33 +1,33 @@
 #!/usr/bin/env bash
 
 export PYTHONPATH="$(pwd):$PYTHONPATH"
-mkdir -p data/reports
 
 PYTHON=$(which python3)
 if [[ -z "${VIRTUAL_ENV}" ]]; then
     PYTHON="pipenv run"
 fi
 
-DATA_FILES=$(find data/raw -type f)
-if [[ -z "$DATA_FILES" ]]; then
-    echo "You must run the download scripts first to generate reports."
-    exit 1
-fi
+# With --download, run_pipeline.py fetches the data itself before the reports
+DOWNLOAD=
+for ARG in "$@"; do
+    if [[ "$ARG" == "--download" ]]; then
+        DOWNLOAD=1
+    fi
+done
 
-OLD_DATA=$(find "data/raw" -mtime +14 -print)
-if [[ -n "$OLD_DATA" ]]; then
-    echo "WARNING: Your data is older than 14 days, you should re-download it."
+if [[ -z "$DOWNLOAD" ]]; then
+    DATA_FILES=$(find data/raw -type f)
+    if [[ -z "$DATA_FILES" ]]; then
+        echo "You must run the download scripts first to generate reports."
+        exit 1
+    fi
+
+    OLD_DATA=$(find "data/raw" -mtime +14 -print)
+    if [[ -n "$OLD_DATA" ]]; then
+        echo "WARNING: Your data is older than 14 days, you should re-download it."
+    fi
 fi
 
-REPORTS=$(find reports -mindepth 1 -maxdepth 1 -type d -exec basename {} \;)
-for REPORT in $REPORTS; do
-    title="Generating report: $REPORT" 
-    echo "================================================================================"
-    printf "%*s\n" $(((${#title}+80)/2)) "$title"
-    echo "================================================================================"
-    $PYTHON ./reports/$REPORT/transform_data.py
-    $PYTHON ./reports/$REPORT/visualize_data.py \
-        -f data/raw/transformed.json \
-        data/reports/$REPORT.html
-    echo "================================================================================"
-done
+# Every report runs in this one process, passing its reviews from transforming to
+#  charting in memory
+$PYTHON ./run_pipeline.py --cache data/transform_cache.sqlite "$@"
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+from lib.raw_data import (
+    dump_pull_request,
+    get_compression_extension,
+    open_raw_file,
+    write_pull_requests_jsonl,
+)
+from lib.synthetic import PullRequestGenerator, get_default_end, get_logins
+
+parser = argparse.ArgumentParser(
+    description="Generates made up PR data in the shape download_data.py writes it, for testing and benchmarking at scale"
+)
+parser.add_argument(
+    "-o",
+    "--output-dir",
+    default=os.path.join("data", "synthetic"),
+    help="directory to write a raw data file per repo to",
+)
+parser.add_argument(
+    "-n",
+    "--pull-requests",
+    default=10000,
+    type=int,
+    help="number of PRs to generate, split evenly between the repos",
+)
+parser.add_argument(
+    "--repositories", default=5, type=int, help="number of repos to generate"
+)
+parser.add_argument(
+    "--reviewers", default=40, type=int, help="number of users who review"
+)
+parser.add_argument(
+    "--authors",
+    default=120,
+    type=int,
+    help="number of users who open PRs, besides the reviewers and dependabot",
+)
+parser.add_argument("--teams", default=3, type=int, help="number of review teams")
+parser.add_argument(
+    "--days", default=365, type=int, help="how many days back the PRs are spread over"
+)
+parser.add_argument(
+    "--end",
+    type=datetime.fromisoformat,
+    help="when the data was downloaded, as an ISO date or time in UTC; defaults to now",
+)
+parser.add_argument(
+    "--seed", default=0, type=int, help="the same seed always gives the same PRs"
+)
+parser.add_argument(
+    "--format",
+    choices=["json", "jsonl"],
+    default="jsonl",
+    help="write a single JSON list per repo, or one PR per line",
+)
+parser.add_argument(
+    "--compression",
+    choices=["gzip", "zstd"],
+    help="compress the files written",
+)
+args = parser.parse_args()
+
+end = args.end.replace(tzinfo=timezone.utc) if args.end else get_default_end()
+reviewers = get_logins("reviewer", args.reviewers)
+generator = PullRequestGenerator(
+    reviewers=reviewers,
+    # Reviewers open PRs too
+    authors=reviewers + get_logins("author", args.authors),
+    teams=get_logins("team", args.teams),
+    end=end,
+    days=args.days,
+    seed=args.seed,
+)
+os.makedirs(args.output_dir, exist_ok=True)
+for i, repository in enumerate(get_logins("repo", args.repositories)):
+    # The first repos get any left over
+    count = args.pull_requests // args.repositories + (
+        i < args.pull_requests % args.repositories
+    )
+    filename = os.path.join(
+        args.output_dir,
+        f"{repository}.{args.format}{get_compression_extension(args.compression)}",
+    )
+    pull_requests = generator.generate(repository, count)
+    with open_raw_file(filename, "w", args.compression) as fh:
+        if args.format == "jsonl":
+            write_pull_requests_jsonl(pull_requests, fh)
+        else:
+            fh.write(
+                "[" + ",\n".join(dump_pull_request(pr) for pr in pull_requests) + "]\n"
+            )
+    print(f"Generated {count} pull requests in {filename}", file=sys.stderr)
@@ -0,0 +1,39 @@
+import argparse
+import os
+import sys
+
+from lib.events import EventTable
+from lib.raw_data import get_repository_name, iter_pull_requests, list_raw_files
+from lib.raw_store import RawStore
+
+parser = argparse.ArgumentParser(
+    description="Imports the output of download_data.py into an SQLite store that reports can query by repo, reviewer and time"
+)
+parser.add_argument(
+    "-d",
+    "--data-dir",
+    default=os.path.join("data", "raw"),
+    help="directory holding the downloaded data of each repo",
+)
+parser.add_argument(
+    "-o",
+    "--output-file",
+    default=os.path.join("data", "raw.sqlite"),
+    help="SQLite file to import into; repos already in it are replaced",
+)
+args = parser.parse_args()
+
+store = RawStore(args.output_file)
+for filename in list_raw_files(args.data_dir):
+    repository_name = get_repository_name(filename)
+    # One repo at a time keeps only that repo in memory
+    events = EventTable.from_pull_requests(
+        {repository_name: iter_pull_requests(os.path.join(args.data_dir, filename))}
+    )
+    store.import_events(events)
+    print(
+        f"Imported {events.event_count} events from {events.pr_count} pull requests"
+        f" in {repository_name}",
+        file=sys.stderr,
+    )
+store.close()
@@ -0,0 +1,519 @@
+import math
+from datetime import datetime
+from html import escape
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+# matplotlib's default colours, so charts look alike whichever renderer drew them
+PALETTE = [
+    "#1f77b4",
+    "#ff7f0e",
+    "#2ca02c",
+    "#d62728",
+    "#9467bd",
+    "#8c564b",
+    "#e377c2",
+    "#7f7f7f",
+    "#bcbd22",
+    "#17becf",
+]
+
+
+class Series(NamedTuple):
+    values: Sequence[float]
+    label: Optional[str] = None
+    color: Optional[str] = None
+
+
+class BarChart(NamedTuple):
+    title: str
+    categories: List[str]
+    series: List[Series]
+    # Series are drawn on top of each other rather than side by side
+    stacked: bool = False
+    # The group of each category, which colours its bar, for charts of one series
+    groups: Optional[List[str]] = None
+    y_label: Optional[str] = None
+    y_range: Optional[Tuple[float, float]] = None
+    y_ticks: Optional[List[float]] = None
+    # The y values are fractions, shown as percentages
+    percent: bool = False
+    # A dashed line across the chart at this value
+    goal: Optional[float] = None
+    # In inches, as matplotlib has it
+    size: Tuple[float, float] = (10, 10)
+
+
+class LineChart(NamedTuple):
+    title: str
+    x: List[datetime]
+    # NaN values are left as gaps in their line
+    series: List[Series]
+    x_label: Optional[str] = None
+    y_label: Optional[str] = None
+    y_range: Optional[Tuple[float, float]] = None
+    y_ticks: Optional[List[float]] = None
+    percent: bool = False
+    size: Tuple[float, float] = (15, 10)
+
+
+class SvgRenderer:
+    """
+    Draws charts as SVG, or as an HTML page holding the SVG when the filename ends
+    in .html, with nothing but the standard library. It only draws what the charts
+    in this repo need, but starts in no time, where matplotlib and chartify take a
+    second or more to import.
+    """
+
+    extension = "svg"
+    pixels_per_inch = 100
+    font_size = 12
+    # Roughly how wide a character is at `font_size`, as text can't be measured
+    char_width = 7
+
+    def render(self, chart, filename):
+        if isinstance(chart, BarChart):
+            svg = self._draw_bar_chart(chart)
+        else:
+            svg = self._draw_line_chart(chart)
+        if filename.endswith(".html"):
+            svg = (
+                "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+                f"<title>{escape(chart.title)}</title>\n</head>\n<body>\n{svg}"
+                "</body>\n</html>\n"
+            )
+        with open(filename, "w") as fh:
+            fh.write(svg)
+
+    def _draw_bar_chart(self, chart):
+        values = [_to_floats(series.values) for series in chart.series]
+        if chart.stacked:
+            tops = [sum(column) for column in zip(*values)]
+        else:
+            tops = [value for series in values for value in series]
+        frame = self._get_frame(chart, chart.categories, tops)
+        elements = frame.draw_axes()
+
+        band = frame.plot_width / max(len(chart.categories), 1)
+        if chart.stacked:
+            width = band * 0.8
+        else:
+            width = band * 0.8 / max(len(values), 1)
+        group_colors = {}
+        if chart.groups:
+            for group in chart.groups:
+                color = PALETTE[len(group_colors) % len(PALETTE)]
+                group_colors.setdefault(group, color)
+        bottoms = [0.0] * len(chart.categories)
+        for i, (series, series_values) in enumerate(zip(chart.series, values)):
+            color = series.color or PALETTE[i % len(PALETTE)]
+            for j, value in enumerate(series_values):
+                if math.isnan(value):
+                    continue
+                if chart.stacked:
+                    x = frame.left + band * j + (band - width) / 2
+                    bottom = bottoms[j]
+                    bottoms[j] += value
+                else:
+                    x = frame.left + band * j + band * 0.1 + width * i
+                    bottom = 0.0
+                top_y = frame.get_y(bottom + value)
+                bottom_y = frame.get_y(bottom)
+                label = chart.categories[j]
+                if series.label:
+                    label = f"{label}, {series.label}"
+                fill = group_colors[chart.groups[j]] if chart.groups else color
+                elements.append(
+                    f'<rect x="{x:.1f}" y="{min(top_y, bottom_y):.1f}"'
+                    f' width="{width:.1f}" height="{abs(bottom_y - top_y):.1f}"'
+                    f' fill="{fill}"><title>{escape(label)}:'
+                    f" {frame.format_value(value)}</title></rect>"
+                )
+        for j, category in enumerate(chart.categories):
+            elements.append(frame.draw_x_label(frame.left + band * (j + 0.5), category))
+        if chart.goal is not None:
+            y = frame.get_y(chart.goal)
+            elements.append(
+                f'<line x1="{frame.left}" y1="{y:.1f}" x2="{frame.right}"'
+                f' y2="{y:.1f}" stroke="black" stroke-dasharray="6 4"/>'
+            )
+
+        if chart.groups:
+            legend = list(group_colors.items())
+        else:
+            legend = [
+                (series.label, series.color or PALETTE[i % len(PALETTE)])
+                for i, series in enumerate(chart.series)
+                if series.label
+            ]
+        elements.extend(frame.draw_legend(legend))
+        return frame.to_svg(elements)
+
+    def _draw_line_chart(self, chart):
+        values = [_to_floats(series.values) for series in chart.series]
+        labels = [
+            str(x.date()) if isinstance(x, datetime) else str(x) for x in chart.x
+        ]
+        frame = self._get_frame(
+            chart, labels, [value for series in values for value in series]
+        )
+        elements = frame.draw_axes()
+
+        times = [x.timestamp() if isinstance(x, datetime) else x for x in chart.x]
+        first, last = min(times, default=0), max(times, default=0)
+        span = (last - first) or 1
+        xs = [frame.left + frame.plot_width * (time - first) / span for time in times]
+        # Only as many labels as fit without overlapping
+        step = math.ceil(len(labels) / max(frame.plot_width // (self.font_size + 4), 1))
+        for x, label in list(zip(xs, labels))[:: max(step, 1)]:
+            elements.append(frame.draw_x_label(x, label))
+
+        legend = []
+        for i, (series, series_values) in enumerate(zip(chart.series, values)):
+            color = series.color or PALETTE[i % len(PALETTE)]
+            path = []
+            move = True
+            for x, value in zip(xs, series_values):
+                if math.isnan(value):
+                    move = True
+                    continue
+                path.append(f"{'M' if move else 'L'}{x:.1f},{frame.get_y(value):.1f}")
+                move = False
+                elements.append(
+                    f'<circle cx="{x:.1f}" cy="{frame.get_y(value):.1f}" r="2.5"'
+                    f' fill="{color}"/>'
+                )
+            if path:
+                elements.append(
+                    f'<path d="{" ".join(path)}" fill="none" stroke="{color}"'
+                    ' stroke-width="1.5"/>'
+                )
+            if series.label:
+                legend.append((series.label, color))
+        elements.extend(frame.draw_legend(legend))
+        return frame.to_svg(elements)
+
+    def _get_frame(self, chart, x_labels, values):
+        width, height = (round(inches * self.pixels_per_inch) for inches in chart.size)
+        values = [value for value in values if not math.isnan(value)]
+        if chart.y_range:
+            low, high = chart.y_range
+        else:
+            low = min(values + [0.0] + list(chart.y_ticks or []))
+            high = max(values + [0.0] + list(chart.y_ticks or []))
+            if getattr(chart, "goal", None) is not None:
+                high = max(high, chart.goal)
+            # Some room above the highest value, as matplotlib leaves
+            high += (high - low) * 0.05
+        y_ticks = chart.y_ticks
+        if y_ticks is None:
+            y_ticks = _get_ticks(low, high)
+            if not chart.y_range:
+                low, high = y_ticks[0], y_ticks[-1]
+        x_label = getattr(chart, "x_label", None)
+        longest = max((len(label) for label in x_labels), default=0)
+        bottom_margin = min(longest * self.char_width + 20, height // 3)
+        if x_label:
+            bottom_margin += 30
+        return _Frame(
+            width=width,
+            height=height,
+            left=80,
+            right=width - 20,
+            top=50,
+            bottom=height - bottom_margin,
+            low=low,
+            high=high if high > low else low + 1,
+            y_ticks=[tick for tick in y_ticks if low <= tick <= high],
+            percent=chart.percent,
+            title=chart.title,
+            x_label=x_label,
+            y_label=chart.y_label,
+            font_size=self.font_size,
+            char_width=self.char_width,
+        )
+
+
+class _Frame(NamedTuple):
+    """
+    Where the plot area of an SVG chart is, in pixels, and the range of y values it
+    spans, with how to draw the axes, labels and legend around it.
+    """
+
+    width: int
+    height: int
+    left: float
+    right: float
+    top: float
+    bottom: float
+    low: float
+    high: float
+    y_ticks: List[float]
+    percent: bool
+    title: str
+    x_label: Optional[str]
+    y_label: Optional[str]
+    font_size: int
+    char_width: int
+
+    @property
+    def plot_width(self):
+        return self.right - self.left
+
+    def get_y(self, value):
+        value = min(max(value, self.low), self.high)
+        return self.bottom - (self.bottom - self.top) * (value - self.low) / (
+            self.high - self.low
+        )
+
+    def format_value(self, value):
+        if self.percent:
+            return f"{value:.0%}"
+        return f"{value:g}"
+
+    def draw_axes(self):
+        elements = [
+            f'<rect width="{self.width}" height="{self.height}" fill="white"/>',
+            self._draw_text(
+                self.width / 2, 30, self.title, size=self.font_size + 4, anchor="middle"
+            ),
+        ]
+        for tick in self.y_ticks:
+            y = self.get_y(tick)
+            elements.append(
+                f'<line x1="{self.left}" y1="{y:.1f}" x2="{self.right}" y2="{y:.1f}"'
+                ' stroke="#dddddd"/>'
+            )
+            label = self.format_value(tick)
+            elements.append(self._draw_text(self.left - 6, y + 4, label, anchor="end"))
+        elements.append(
+            f'<polyline points="{self.left},{self.top} {self.left},{self.bottom}'
+            f' {self.right},{self.bottom}" fill="none" stroke="black"/>'
+        )
+        if self.y_label:
+            x, y = 20, (self.top + self.bottom) / 2
+            elements.append(
+                self._draw_text(x, y, self.y_label, anchor="middle", rotate=True)
+            )
+        if self.x_label:
+            elements.append(
+                self._draw_text(
+                    (self.left + self.right) / 2,
+                    self.height - 10,
+                    self.x_label,
+                    anchor="middle",
+                )
+            )
+        return elements
+
+    def draw_x_label(self, x, label):
+        # Reading upwards, ending just below the axis
+        return self._draw_text(x + 4, self.bottom + 8, label, anchor="end", rotate=True)
+
+    def draw_legend(self, entries):
+        if not entries:
+            return []
+        width = max(len(label) for label, _ in entries) * self.char_width + 34
+        x = self.right - width - 10
+        y = self.top + 10
+        elements = [
+            f'<rect x="{x}" y="{y}" width="{width}"'
+            f' height="{len(entries) * 18 + 8}" fill="white" stroke="#cccccc"/>'
+        ]
+        for i, (label, color) in enumerate(entries):
+            row = y + 8 + i * 18
+            elements.append(
+                f'<rect x="{x + 8}" y="{row}" width="12" height="12" fill="{color}"/>'
+            )
+            elements.append(self._draw_text(x + 26, row + 11, label))
+        return elements
+
+    def to_svg(self, elements):
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}"'
+            f' height="{self.height}" viewBox="0 0 {self.width} {self.height}"'
+            ' font-family="sans-serif">\n' + "\n".join(elements) + "\n</svg>\n"
+        )
+
+    def _draw_text(self, x, y, text, size=None, anchor="start", rotate=False):
+        transform = f' transform="rotate(-90 {x:.1f} {y:.1f})"' if rotate else ""
+        return (
+            f'<text x="{x:.1f}" y="{y:.1f}" font-size="{size or self.font_size}"'
+            f' text-anchor="{anchor}"{transform}>{escape(str(text))}</text>'
+        )
+
+
+class MatplotlibRenderer:
+    """
+    Draws charts with matplotlib, as PNGs unless the filename says otherwise.
+    """
+
+    extension = "png"
+
+    def __init__(self):
+        # Only imported when it's used, as it takes a second or so
+        from matplotlib import pyplot
+
+        self.pyplot = pyplot
+
+    def render(self, chart, filename):
+        pyplot = self.pyplot
+        figure = pyplot.figure(figsize=chart.size)
+        if isinstance(chart, BarChart):
+            self._draw_bars(chart)
+        else:
+            for series in chart.series:
+                pyplot.plot(
+                    chart.x,
+                    _to_floats(series.values),
+                    marker=".",
+                    label=series.label,
+                    color=series.color,
+                )
+            if chart.x_label:
+                pyplot.xlabel(chart.x_label)
+        pyplot.xticks(rotation=90)
+        if chart.y_range:
+            pyplot.ylim(list(chart.y_range))
+        if chart.y_ticks is not None:
+            if chart.percent:
+                pyplot.yticks(
+                    ticks=chart.y_ticks,
+                    labels=[f"{tick:.0%}" for tick in chart.y_ticks],
+                )
+            else:
+                pyplot.yticks(ticks=chart.y_ticks)
+        if getattr(chart, "groups", None) or any(s.label for s in chart.series):
+            pyplot.legend()
+        if chart.y_label:
+            pyplot.ylabel(chart.y_label)
+        pyplot.title(chart.title)
+        pyplot.grid(True)
+        pyplot.savefig(filename)
+        pyplot.close(figure)
+
+    def _draw_bars(self, chart):
+        pyplot = self.pyplot
+        positions = list(range(len(chart.categories)))
+        if chart.groups:
+            # A bar call per group, for the legend to name
+            series = chart.series[0]
+            for group in dict.fromkeys(chart.groups):
+                indexes = [i for i, name in enumerate(chart.groups) if name == group]
+                pyplot.bar(
+                    indexes,
+                    [_to_float(series.values[i]) for i in indexes],
+                    label=group,
+                )
+        else:
+            width = 0.8 if chart.stacked else 0.8 / len(chart.series)
+            bottoms = [0.0] * len(positions)
+            for i, series in enumerate(chart.series):
+                values = _to_floats(series.values)
+                if chart.stacked:
+                    x = positions
+                else:
+                    offset = (i - (len(chart.series) - 1) / 2) * width
+                    x = [position + offset for position in positions]
+                pyplot.bar(
+                    x,
+                    values,
+                    width,
+                    bottom=bottoms if chart.stacked else None,
+                    label=series.label,
+                    color=series.color,
+                )
+                if chart.stacked:
+                    bottoms = [bottom + value for bottom, value in zip(bottoms, values)]
+        pyplot.xticks(positions, chart.categories)
+        if chart.goal is not None:
+            pyplot.axhline(chart.goal, color="black", linestyle="--")
+
+
+class ChartifyRenderer:
+    """
+    Draws bar charts of one series with chartify, as interactive HTML pages.
+    """
+
+    extension = "html"
+
+    def __init__(self):
+        # Only imported when it's used, as between them they take seconds
+        import chartify
+        import pandas
+
+        self.chartify = chartify
+        self.pandas = pandas
+
+    def render(self, chart, filename):
+        if not isinstance(chart, BarChart) or len(chart.series) != 1:
+            raise ValueError("chartify can only draw bar charts of one series here")
+        grouped = chart.groups is not None
+        data_frame = self.pandas.DataFrame(
+            {
+                "category": chart.categories,
+                "value": _to_floats(chart.series[0].values),
+                "group": chart.groups or ["Other"] * len(chart.categories),
+            }
+        )
+        ch = self.chartify.Chart(blank_labels=True, x_axis_type="categorical")
+        ch.set_title(chart.title)
+        ch.plot.bar(
+            data_frame=data_frame,
+            categorical_columns=(["group", "category"] if grouped else ["category"]),
+            numeric_column="value",
+            **({"color_column": "group"} if grouped else {}),
+        )
+        if chart.goal is not None:
+            ch.callout.line(chart.goal, line_dash="dashed")
+        if chart.y_range:
+            ch.axes.set_yaxis_range(*chart.y_range)
+        if chart.percent:
+            ch.axes.set_yaxis_tick_format("0%")
+        ch.axes.set_xaxis_tick_orientation(["diagonal", "horizontal"])
+        ch.save(filename)
+
+
+RENDERERS = {
+    "svg": SvgRenderer,
+    "matplotlib": MatplotlibRenderer,
+    "chartify": ChartifyRenderer,
+}
+
+
+def get_renderer(name):
+    """
+    The renderer called `name` in `RENDERERS`, importing whatever it draws with.
+    """
+    return RENDERERS[name]()
+
+
+def add_renderer_arguments(parser):
+    parser.add_argument(
+        "--renderer",
+        default="svg",
+        choices=list(RENDERERS),
+        help="what to draw charts with; svg needs nothing installed and starts"
+        " fastest, while matplotlib and chartify are imported only when chosen",
+    )
+
+
+def _to_float(value):
+    return float("nan") if value is None else float(value)
+
+
+def _to_floats(values):
+    return [_to_float(value) for value in values]
+
+
+def _get_ticks(low, high, count=5):
+    """
+    Evenly spaced round numbers from at or below `low` to at or above `high`.
+    """
+    if high <= low:
+        high = low + 1
+    step = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= step)
+    first = math.floor(low / step)
+    last = math.ceil(high / step)
+    return [round(i * step, 10) for i in range(first, last + 1)]
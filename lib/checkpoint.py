@@ -0,0 +1,111 @@
+import json
+import os
+
+from lib.raw_data import (
+    get_compression,
+    iter_pull_requests,
+    open_raw_file,
+    write_pull_requests_jsonl,
+)
+
+
+class Checkpoint:
+    """
+    Keeps the pages of a download on disk as they arrive, along with the cursor to
+    carry on from, so an interrupted download can be resumed instead of restarted.
+
+    Pages are appended to a hidden `.<output>.partial` file next to the output file,
+    and `.<output>.checkpoint.json` records the cursor, the number of PRs so far and
+    how much of the partial file belongs to complete pages. The partial file uses the
+    compression of the output file, with each page appended as its own segment.
+    """
+
+    def __init__(self, output_file):
+        directory, filename = os.path.split(output_file)
+        self.checkpoint_file = os.path.join(directory, f".{filename}.checkpoint.json")
+        self.partial_file = os.path.join(directory, f".{filename}.partial")
+        self.compression = get_compression(output_file)
+        self.state = {}
+
+    @property
+    def cursor(self):
+        return self.state.get("cursor")
+
+    @property
+    def is_complete(self):
+        return self.state.get("complete", False)
+
+    @property
+    def last_updated(self):
+        return self.state.get("last_updated")
+
+    def resume(self, repo, last_synced):
+        """
+        Loads the checkpoint of an earlier run of the same download, returning whether
+        there was one to carry on from.
+        """
+        if not os.path.exists(self.checkpoint_file):
+            return False
+        with open(self.checkpoint_file) as fh:
+            state = json.load(fh)
+        if state["repo"] != repo or state["last_synced"] != last_synced:
+            return False
+        if not os.path.exists(self.partial_file):
+            return False
+        if os.path.getsize(self.partial_file) < state["partial_size"]:
+            return False
+        # Anything after the last complete page will be downloaded again
+        with open(self.partial_file, "a") as fh:
+            fh.truncate(state["partial_size"])
+        self.state = state
+        return True
+
+    def start(self, repo, last_synced):
+        self.state = dict(
+            repo=repo,
+            last_synced=last_synced,
+            cursor=None,
+            complete=False,
+            count=0,
+            last_updated=None,
+            partial_size=0,
+        )
+        with open(self.partial_file, "w"):
+            pass
+        self._save()
+
+    def add_page(self, page, last_updated):
+        with open_raw_file(self.partial_file, "a", self.compression) as fh:
+            write_pull_requests_jsonl(page.nodes, fh)
+        # The page must be on disk before the checkpoint says it is, or a crash could
+        #  leave a checkpoint to resume from whose pages were never written. The
+        #  compressed writers don't expose the file, so it's synced once they close
+        fd = os.open(self.partial_file, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        partial_size = os.path.getsize(self.partial_file)
+        self.state.update(
+            cursor=page.cursor,
+            complete=not page.has_previous_page,
+            count=self.state["count"] + len(page.nodes),
+            last_updated=last_updated,
+            partial_size=partial_size,
+        )
+        self._save()
+
+    def iter_pull_requests(self):
+        return iter_pull_requests(self.partial_file)
+
+    def finish(self):
+        for filename in [self.checkpoint_file, self.partial_file]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _save(self):
+        # Replacing the file in one step means a crash can't leave half a checkpoint
+        temporary_file = self.checkpoint_file + ".tmp"
+        with open(temporary_file, "w") as fh:
+            fh.write(json.dumps(self.state, indent=2) + "\n")
+        os.replace(temporary_file, self.checkpoint_file)
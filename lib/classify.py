@@ -0,0 +1,177 @@
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from lib.date_utils import get_due_wall_times
+from lib.events import (
+    CLOSED,
+    MERGED,
+    NO_LOGIN,
+    PULL_REQUEST_REVIEW,
+    REVIEW_REQUEST_REMOVED,
+    REVIEW_REQUESTED,
+)
+from lib.models import Review, ReviewStatus
+from lib.profiling import get_profiler
+from lib.timestamps import UtcOffsetCache
+
+STATUSES = [ReviewStatus.ON_TIME, ReviewStatus.LATE, ReviewStatus.NO_RESPONSE]
+ON_TIME, LATE, NO_RESPONSE = range(len(STATUSES))
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def get_due_times(request_times, utc_offsets):
+    """
+    The `get_due_time` of each of the epoch `request_times` in the timezone of the
+    `UtcOffsetCache` `utc_offsets`, as the due epochs, the index of each into the
+    distinct due times and their isoformat.
+    """
+    tzinfo = utc_offsets.tzinfo
+    local_times = request_times + utc_offsets.get_offsets(request_times)
+    due_wall_times, inverse = np.unique(
+        get_due_wall_times(local_times), return_inverse=True
+    )
+    due_times = [
+        (EPOCH + timedelta(seconds=int(wall_time))).replace(tzinfo=tzinfo)
+        for wall_time in due_wall_times
+    ]
+    due_epochs = np.array(
+        [int(due_time.timestamp()) for due_time in due_times], dtype=np.int64
+    )
+    inverse = inverse.ravel()
+    labels = [due_time.isoformat() for due_time in due_times]
+    return due_epochs[inverse], inverse, labels
+
+
+def classify_reviews(events, tz, prs=None):
+    """
+    Works out the status of every requested review in `events`, an `EventTable`, or
+    only in the PRs selected by the boolean array `prs`, giving the same reviews in
+    the same order as stepping through the timeline of each PR in turn.
+
+    A request is due at the `get_due_time` of when it was made in `tz`. It's settled
+    by the reviewer's next review or the removal of the request, and every close or
+    merge of the PR while it's outstanding counts against it too. Each (PR, reviewer)
+    pair is handled as a group of rows: its requests, reviews and removals, plus a
+    copy of every close of the PR, so all of them can be classified at once.
+    """
+    return [review for _, review in _classify_reviews(events, tz, prs)]
+
+
+def classify_reviews_by_pr(events, tz, prs=None):
+    """
+    `classify_reviews`, but with the reviews of each PR in a list of their own.
+    """
+    reviews_by_pr = [[] for _ in range(events.pr_count)]
+    for pr, review in _classify_reviews(events, tz, prs):
+        reviews_by_pr[pr].append(review)
+    return reviews_by_pr
+
+
+def _classify_reviews(events, tz, prs=None):
+    """
+    The reviews of `classify_reviews`, each paired with the index of its PR.
+    """
+    utc_offsets = UtcOffsetCache(tz)
+    event_pr = np.repeat(
+        np.arange(events.pr_count, dtype=np.int64), np.diff(events.event_offsets)
+    )
+    if prs is None:
+        selected = np.ones(events.event_count, dtype=bool)
+    else:
+        selected = prs[event_pr]
+    event_type = events.event_type
+    event_login = events.event_login.astype(np.int64)
+    login_count = max(len(events.logins), 1)
+
+    has_reviewer = selected & (event_login != NO_LOGIN)
+    is_request = has_reviewer & (event_type == REVIEW_REQUESTED)
+    reviewer_rows = np.flatnonzero(
+        has_reviewer
+        & np.isin(
+            event_type, [REVIEW_REQUESTED, REVIEW_REQUEST_REMOVED, PULL_REQUEST_REVIEW]
+        )
+    )
+
+    # Every pair with a request, sorted by PR, and a copy of each close for each pair
+    pairs = np.unique(event_pr[is_request] * login_count + event_login[is_request])
+    pair_prs, pair_logins = np.divmod(pairs, login_count)
+    close_rows = np.flatnonzero(selected & np.isin(event_type, [CLOSED, MERGED]))
+    first_pairs = np.searchsorted(pair_prs, event_pr[close_rows], "left")
+    last_pairs = np.searchsorted(pair_prs, event_pr[close_rows], "right")
+    pair_counts = last_pairs - first_pairs
+    close_rows = np.repeat(close_rows, pair_counts)
+    close_pairs = np.repeat(
+        first_pairs - np.cumsum(pair_counts) + pair_counts, pair_counts
+    ) + np.arange(len(close_rows))
+
+    rows = np.concatenate([reviewer_rows, close_rows])
+    logins = np.concatenate([event_login[reviewer_rows], pair_logins[close_pairs]])
+    groups = event_pr[rows] * login_count + logins
+    order = np.lexsort((rows, groups))
+    rows, logins, groups = rows[order], logins[order], groups[order]
+    types = event_type[rows]
+    times = events.event_time[rows]
+    is_close = np.isin(types, [CLOSED, MERGED])
+    is_request = types == REVIEW_REQUESTED
+
+    # Whether a request is outstanding at a row only depends on whether the last
+    #  request, review or removal before it in its group was a request
+    positions = np.arange(len(rows))
+    group_starts = np.ones(len(rows), dtype=bool)
+    group_starts[1:] = groups[1:] != groups[:-1]
+    group_starts = np.maximum.accumulate(np.where(group_starts, positions, 0))
+    previous = np.full(len(rows), -1, dtype=np.int64)
+    previous[1:] = np.maximum.accumulate(np.where(is_close, -1, positions))[:-1]
+    previous[previous < group_starts] = -1
+    outstanding = (previous >= 0) & is_request[np.maximum(previous, 0)]
+
+    # Closes list outstanding requests in the order their reviewers were first
+    #  requested since they last settled one
+    streak_starts = np.maximum.accumulate(
+        np.where(is_request & ~outstanding, positions, -1)
+    )
+
+    due_times = np.zeros(len(rows), dtype=np.int64)
+    due_labels = np.zeros(len(rows), dtype=np.int64)
+    requests = np.flatnonzero(is_request)
+    with get_profiler().stage("due_times") as stage:
+        due_times[requests], due_labels[requests], labels = get_due_times(
+            times[requests], utc_offsets
+        )
+        stage.items += len(requests)
+
+    unmatched = np.flatnonzero((types == REVIEW_REQUEST_REMOVED) & ~outstanding)
+    for i in unmatched[np.argsort(rows[unmatched])]:
+        # unusual state we don't expect to ever happen:
+        reviewer = events.logins[logins[i]]
+        print(
+            f"Review request removed but reviewer #{reviewer} not found",
+            file=sys.stderr,
+        )
+
+    classified = np.flatnonzero(outstanding & ~is_request)
+    request = previous[classified]
+    due = due_times[request]
+    statuses = np.where(
+        types[classified] == PULL_REQUEST_REVIEW,
+        np.where(times[classified] <= due, ON_TIME, LATE),
+        np.where(times[classified] > due, LATE, NO_RESPONSE),
+    )
+    order = np.lexsort(
+        (
+            np.where(is_close[classified], rows[streak_starts[request]], 0),
+            rows[classified],
+        )
+    )
+    return [
+        (pr, Review(events.logins[login], STATUSES[status], labels[label]))
+        for pr, login, status, label in zip(
+            event_pr[rows[classified][order]].tolist(),
+            logins[classified][order].tolist(),
+            statuses[order].tolist(),
+            due_labels[request][order].tolist(),
+        )
+    ]
@@ -1,3 +1,16 @@
+import numpy as np
+
+START_OF_DAY_HOUR = 10
+MIDDAY_HOUR = 12
+PR_BREAKPOINT_HOUR = 14
+END_OF_DAY_HOUR = 18
+
+SECONDS_PER_HOUR = 60 * 60
+SECONDS_PER_DAY = 24 * SECONDS_PER_HOUR
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+
 def days_until_next_business_day(day: int) -> int:
     # If Mon/Tue/Wed/Thur, next day is tomorrow
     if day in list(range(0, 4)):
@@ -8,19 +21,19 @@ def days_until_next_business_day(day: int) -> int:
 
 
 def startofday(arrow_date):
-    return arrow_date.replace(hour=10, minute=0, second=0)
+    return arrow_date.replace(hour=START_OF_DAY_HOUR, minute=0, second=0)
 
 
 def pr_breakpoint(arrow_date):
-    return arrow_date.replace(hour=14, minute=0, second=0)
+    return arrow_date.replace(hour=PR_BREAKPOINT_HOUR, minute=0, second=0)
 
 
 def midday(arrow_date):
-    return arrow_date.replace(hour=12, minute=0, second=0)
+    return arrow_date.replace(hour=MIDDAY_HOUR, minute=0, second=0)
 
 
 def endofday(arrow_date):
-    return arrow_date.replace(hour=18, minute=0, second=0)
+    return arrow_date.replace(hour=END_OF_DAY_HOUR, minute=0, second=0)
 
 
 def get_due_time(request_time):
@@ -31,3 +44,18 @@ def get_due_time(request_time):
         days=+days_until_next_business_day(request_time.weekday()),
     )
     return midday(next_business_day)
+
+
+def get_due_wall_times(request_times):
+    """
+    `get_due_time` for a numpy array of local wall clock times, given as seconds since
+    the epoch, returning the due times in the same form.
+    """
+    days, seconds = np.divmod(request_times, SECONDS_PER_DAY)
+    weekdays = (days + EPOCH_WEEKDAY) % 7
+    next_business_days = days + np.where(weekdays < 4, 1, 7 - weekdays)
+    return np.where(
+        seconds < PR_BREAKPOINT_HOUR * SECONDS_PER_HOUR,
+        days * SECONDS_PER_DAY + END_OF_DAY_HOUR * SECONDS_PER_HOUR,
+        next_business_days * SECONDS_PER_DAY + MIDDAY_HOUR * SECONDS_PER_HOUR,
+    )
@@ -0,0 +1,70 @@
+import os
+
+
+def add_download_arguments(parser):
+    """
+    Adds the options of download_all_data.py to `parser`. They're kept apart from it,
+    so scripts taking them only import requests, arrow and the GitHub client when they
+    download something.
+    """
+    parser.add_argument(
+        "--days-old",
+        "-d",
+        type=int,
+        default=14,
+        help="How many days old should the PRs be to be included in the downloaded"
+        " set?",
+    )
+    parser.add_argument(
+        "--org",
+        type=str,
+        default="mpb-com",
+        help="Which org / user to download PR data from.",
+    )
+    parser.add_argument(
+        "--user",
+        type=str,
+        default=os.getenv("USER"),
+        help="Your github username that matches the $GH_API_TOKEN environment"
+        " variable.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=int,
+        default=8,
+        help="How many repositories to download at the same time.",
+    )
+    parser.add_argument(
+        "--incremental",
+        "-i",
+        action="store_true",
+        help="Only download PRs updated since the last sync of each repository.",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=os.path.join("data", "sync_state.json"),
+        help="File recording the last sync point of each repository.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "jsonl"],
+        default="json",
+        help="Write each repository as a single JSON list, or as one PR per line.",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=["gzip", "zstd"],
+        help="Compress the downloaded files; zstd needs the zstandard package.",
+    )
+    parser.add_argument(
+        "-tz",
+        default="Europe/London",
+        help="timezone to use for calculating business hours for review status",
+    )
+    parser.add_argument(
+        "--resume",
+        "-r",
+        action="store_true",
+        help="Carry on interrupted downloads from their last complete page.",
+    )
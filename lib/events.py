@@ -0,0 +1,269 @@
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+EVENT_TYPES = [
+    "ReviewRequestedEvent",
+    "ReviewRequestRemovedEvent",
+    "PullRequestReview",
+    "ClosedEvent",
+    "MergedEvent",
+]
+EVENT_TYPE_CODES = {typename: code for code, typename in enumerate(EVENT_TYPES)}
+(
+    REVIEW_REQUESTED,
+    REVIEW_REQUEST_REMOVED,
+    PULL_REQUEST_REVIEW,
+    CLOSED,
+    MERGED,
+) = range(len(EVENT_TYPES))
+
+# Used in place of a login for teams, and for users that no longer exist
+NO_LOGIN = -1
+# Used in place of a timestamp that is missing, as in files downloaded before PR
+#  creation times were included
+NO_TIME = np.iinfo(np.int64).min
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_timestamps(timestamps):
+    """
+    Converts GitHub's `YYYY-MM-DDTHH:MM:SSZ` timestamps into int64 epoch seconds.
+    """
+    if not timestamps:
+        return np.zeros(0, dtype=np.int64)
+    naive = np.array(
+        [timestamp.rstrip("Z") if timestamp else "NaT" for timestamp in timestamps]
+    )
+    return naive.astype("datetime64[s]").astype(np.int64)
+
+
+def format_timestamps(epochs):
+    timestamps = np.datetime_as_string(epochs.astype("datetime64[s]"))
+    return [f"{timestamp}Z" for timestamp in timestamps]
+
+
+def to_datetime(epoch):
+    return datetime.fromtimestamp(int(epoch), timezone.utc)
+
+
+def _pack_strings(strings):
+    """
+    Stores strings as one UTF-8 buffer plus offsets, which unlike fixed width numpy
+    strings doesn't pad every title to the length of the longest one.
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(buffer, offsets):
+    data = buffer.tobytes()
+    return [
+        data[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+
+
+class Interner:
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self.ids = {string: i for i, string in enumerate(self.strings)}
+
+    def __call__(self, string):
+        if string not in self.ids:
+            self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return self.ids[string]
+
+
+class EventTable:
+    """
+    All PRs flattened into columns: one row per PR, and one row per timeline event
+    with an integer coded event type, the interned login of the reviewer (or -1) and
+    an int64 epoch timestamp. Events are stored grouped by PR in timeline order, so
+    the events of PR `i` are rows `event_offsets[i]` to `event_offsets[i + 1]`.
+    """
+
+    def __init__(
+        self,
+        logins,
+        repositories,
+        titles,
+        pr_repository,
+        pr_author,
+        pr_created,
+        event_offsets,
+        event_type,
+        event_login,
+        event_time,
+    ):
+        self.logins = logins
+        self.repositories = repositories
+        self.titles = titles
+        self.pr_repository = pr_repository
+        self.pr_author = pr_author
+        self.pr_created = pr_created
+        self.event_offsets = event_offsets
+        self.event_type = event_type
+        self.event_login = event_login
+        self.event_time = event_time
+
+    @property
+    def pr_count(self):
+        return len(self.pr_repository)
+
+    @property
+    def event_count(self):
+        return len(self.event_type)
+
+    @classmethod
+    def from_pull_requests(cls, repositories):
+        """
+        Builds the table from a mapping of repository name to its PRs, as returned by
+        `generate.get_raw_data`.
+        """
+        logins = Interner()
+        repository_names = Interner()
+        titles = []
+        pr_repository, pr_author, pr_created = [], [], []
+        event_offsets = [0]
+        event_type, event_login, event_time = [], [], []
+
+        for repository_name, pull_requests in repositories.items():
+            repository = repository_names(repository_name)
+            for pr in pull_requests:
+                titles.append(pr["title"])
+                pr_repository.append(repository)
+                pr_author.append(_get_login(pr.get("author"), logins))
+                pr_created.append(pr.get("createdAt"))
+                for event in pr["timelineItems"]["nodes"]:
+                    typename = event["__typename"]
+                    if typename not in EVENT_TYPE_CODES:
+                        print(f"Unknown type: {typename}", file=sys.stderr)
+                        continue
+                    event_type.append(EVENT_TYPE_CODES[typename])
+                    if typename == "PullRequestReview":
+                        event_login.append(_get_login(event["author"], logins))
+                        event_time.append(event["submittedAt"])
+                    elif typename in {
+                        "ReviewRequestedEvent",
+                        "ReviewRequestRemovedEvent",
+                    }:
+                        reviewer = event["requestedReviewer"]
+                        event_login.append(_get_login(reviewer, logins))
+                        event_time.append(event["createdAt"])
+                    else:
+                        event_login.append(NO_LOGIN)
+                        event_time.append(event["createdAt"])
+                event_offsets.append(len(event_type))
+
+        return cls(
+            logins=logins.strings,
+            repositories=repository_names.strings,
+            titles=titles,
+            pr_repository=np.array(pr_repository, dtype=np.int32),
+            pr_author=np.array(pr_author, dtype=np.int32),
+            pr_created=parse_timestamps(pr_created),
+            event_offsets=np.array(event_offsets, dtype=np.int64),
+            event_type=np.array(event_type, dtype=np.int8),
+            event_login=np.array(event_login, dtype=np.int32),
+            event_time=parse_timestamps(event_time),
+        )
+
+    def save(self, filename):
+        logins, login_offsets = _pack_strings(self.logins)
+        repositories, repository_offsets = _pack_strings(self.repositories)
+        titles, title_offsets = _pack_strings(self.titles)
+        with open(filename, "wb") as fh:
+            np.savez_compressed(
+                fh,
+                logins=logins,
+                login_offsets=login_offsets,
+                repositories=repositories,
+                repository_offsets=repository_offsets,
+                titles=titles,
+                title_offsets=title_offsets,
+                pr_repository=self.pr_repository,
+                pr_author=self.pr_author,
+                pr_created=self.pr_created,
+                event_offsets=self.event_offsets,
+                event_type=self.event_type,
+                event_login=self.event_login,
+                event_time=self.event_time,
+            )
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(
+                logins=_unpack_strings(data["logins"], data["login_offsets"]),
+                repositories=_unpack_strings(
+                    data["repositories"], data["repository_offsets"]
+                ),
+                titles=_unpack_strings(data["titles"], data["title_offsets"]),
+                pr_repository=data["pr_repository"],
+                pr_author=data["pr_author"],
+                pr_created=data["pr_created"],
+                event_offsets=data["event_offsets"],
+                event_type=data["event_type"],
+                event_login=data["event_login"],
+                event_time=data["event_time"],
+            )
+
+    def get_login(self, login):
+        return self.logins[login] if login != NO_LOGIN else None
+
+    def iter_pull_requests(self, repository_name=None):
+        """
+        Rebuilds the PRs in the shape download_data.py writes them, for code that
+        still works on nested dicts.
+        """
+        created = format_timestamps(self.pr_created)
+        times = format_timestamps(self.event_time)
+        for i in range(self.pr_count):
+            repository = self.repositories[self.pr_repository[i]]
+            if repository_name is not None and repository != repository_name:
+                continue
+            nodes = []
+            for j in range(self.event_offsets[i], self.event_offsets[i + 1]):
+                typename = EVENT_TYPES[self.event_type[j]]
+                login = self.get_login(self.event_login[j])
+                user = {"login": login} if login is not None else {}
+                if typename == "PullRequestReview":
+                    nodes.append(
+                        {
+                            "__typename": typename,
+                            "submittedAt": times[j],
+                            "author": user,
+                        }
+                    )
+                elif typename in {"ReviewRequestedEvent", "ReviewRequestRemovedEvent"}:
+                    nodes.append(
+                        {
+                            "__typename": typename,
+                            "createdAt": times[j],
+                            "requestedReviewer": user,
+                        }
+                    )
+                else:
+                    nodes.append({"__typename": typename, "createdAt": times[j]})
+            author = self.get_login(self.pr_author[i])
+            pr = {
+                "title": self.titles[i],
+                "createdAt": created[i],
+                "baseRepository": {"name": repository},
+                "author": {"login": author} if author is not None else {},
+                "timelineItems": {"nodes": nodes},
+            }
+            if self.pr_created[i] == NO_TIME:
+                del pr["createdAt"]
+            yield pr
+
+
+def _get_login(user, logins):
+    if not user or "login" not in user:
+        return NO_LOGIN
+    return logins(user["login"])
@@ -0,0 +1,402 @@
+import json
+import random
+import sys
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, NamedTuple, Optional
+
+import arrow
+import requests
+from requests.adapters import HTTPAdapter
+
+from lib.profiling import get_profiler
+
+API_TOKEN_KEY = "GH_API_TOKEN"
+ENDPOINT = "https://api.github.com/graphql"
+# Heavy pages make GitHub give up after ~10 seconds with a 502, so there is no point
+#  in waiting much longer than that for a response.
+REQUEST_TIMEOUT = 30
+RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+TIMEOUT_STATUSES = {502, 504}
+
+# How many more timeline items to fetch per PR in each follow-up round, and how many
+#  PRs to ask for at most in a single round.
+TIMELINE_PAGE_SIZE = 100
+TIMELINE_PRS_PER_ROUND = 50
+TIMELINE_ITEM_TYPES = "[REVIEW_REQUESTED_EVENT, REVIEW_REQUEST_REMOVED_EVENT, PULL_REQUEST_REVIEW, CLOSED_EVENT, MERGED_EVENT]"
+
+FRAGMENTS = """
+fragment TimelineItems on PullRequestTimelineItemsConnection {
+  pageInfo {
+    hasNextPage
+    endCursor
+  }
+  nodes {
+    ... on ReviewRequestedEvent {
+      __typename
+      createdAt
+      requestedReviewer {
+        ...ReviewerInfo
+      }
+    }
+    ... on ReviewRequestRemovedEvent {
+      __typename
+      createdAt
+      requestedReviewer {
+        ...ReviewerInfo
+      }
+    }
+    ... on PullRequestReview {
+      __typename
+      state
+      submittedAt
+      author {
+        login
+      }
+    }
+    ... on ClosedEvent {
+      __typename
+      createdAt
+    }
+    ... on MergedEvent {
+      __typename
+      createdAt
+    }
+  }
+}
+
+fragment ReviewerInfo on RequestedReviewer {
+  ... on User {
+    login
+  }
+  ... on Team {
+    name
+  }
+}
+"""
+
+QUERY = (
+    """
+query($repoOwner: String!, $repoName: String!, $prBefore: String, $prCount: Int = 100, $orderField: IssueOrderField = CREATED_AT){
+  rateLimit {
+    cost
+    remaining
+    resetAt
+  }
+  repository(owner: $repoOwner, name: $repoName) {
+    pullRequests(last: $prCount, before: $prBefore, orderBy: {field:$orderField, direction:ASC}) {
+      pageInfo {
+        startCursor
+        hasPreviousPage
+      }
+      nodes {
+        id
+        title
+        createdAt
+        updatedAt
+        baseRepository { name }
+        author { login }
+        timelineItems(first: 200, itemTypes:%s) {
+          ...TimelineItems
+        }
+      }
+    }
+  }
+}
+"""
+    % TIMELINE_ITEM_TYPES
+    + FRAGMENTS
+)
+
+
+def get_timeline_query(pr_count):
+    """
+    Builds a query that fetches the next page of the timeline of `pr_count` PRs at
+    once. Each PR needs its own cursor, so every PR gets an aliased `node` field with
+    its own `$id<n>` and `$after<n>` variables.
+    """
+    parameters = ", ".join(f"$id{i}: ID!, $after{i}: String" for i in range(pr_count))
+    fields = "".join(
+        f"""
+  pr{i}: node(id: $id{i}) {{
+    ... on PullRequest {{
+      timelineItems(first: {TIMELINE_PAGE_SIZE}, after: $after{i}, itemTypes:{TIMELINE_ITEM_TYPES}) {{
+        ...TimelineItems
+      }}
+    }}
+  }}"""
+        for i in range(pr_count)
+    )
+    return (
+        f"""
+query({parameters}){{
+  rateLimit {{
+    cost
+    remaining
+    resetAt
+  }}{fields}
+}}
+"""
+        + FRAGMENTS
+    )
+
+
+class PullRequestPage(NamedTuple):
+    nodes: List[dict]
+    # The cursor to carry on paging from, and whether there is anything left to fetch
+    cursor: Optional[str]
+    has_previous_page: bool
+
+
+class GitHubError(Exception):
+    @property
+    def is_rate_limited(self):
+        return any(error.get("type") == "RATE_LIMITED" for error in self.args[0])
+
+    @property
+    def is_timeout(self):
+        return any("timeout" in error.get("message", "") for error in self.args[0])
+
+
+def create_session(token, pool_size=10):
+    """
+    A session shares its connections between requests, and between threads when
+    several repositories are downloaded at once.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.headers.update(
+        {
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/vnd.github.starfire-preview+json",
+        }
+    )
+    return session
+
+
+def run_query(session, query, variables):
+    data = json.dumps({"query": query, "variables": variables})
+    with get_profiler().stage("github_query"):
+        response = session.post(ENDPOINT, data=data, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        result = response.json()
+
+    if "errors" in result:
+        raise GitHubError(result["errors"])
+    return result["data"]
+
+
+class BatchScheduler:
+    """
+    Picks how many PRs to request per query, and retries queries that fail.
+
+    The page size shrinks when GitHub times out on a heavy page and grows back while
+    pages come back quickly. Rate limits and server errors are retried with
+    exponential backoff and jitter, and when the remaining API budget won't cover
+    another page the scheduler waits for it to reset.
+    """
+
+    def __init__(
+        self,
+        max_batch_size=100,
+        min_batch_size=5,
+        max_retries=6,
+        fast_response=3.0,
+        slow_response=8.0,
+        backoff_base=1.0,
+        backoff_cap=60.0,
+    ):
+        self.batch_size = max_batch_size
+        self.max_batch_size = max_batch_size
+        self.min_batch_size = min(min_batch_size, max_batch_size)
+        self.max_retries = max_retries
+        self.fast_response = fast_response
+        self.slow_response = slow_response
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    def run(self, session, make_query):
+        """
+        `make_query` is called with the current batch size and returns the query and
+        variables to send.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                data = run_query(session, *make_query(self.batch_size))
+            except requests.Timeout:
+                self._shrink()
+                delay = self._backoff(attempt)
+                reason = "timed out"
+            except requests.ConnectionError:
+                delay = self._backoff(attempt)
+                reason = "lost its connection"
+            except requests.HTTPError as e:
+                status = e.response.status_code
+                if not self._is_retryable(e.response) or attempt == self.max_retries:
+                    raise
+                if status in TIMEOUT_STATUSES:
+                    self._shrink()
+                delay = self._retry_after(e.response) or self._backoff(attempt)
+                reason = f"failed with {status}"
+            except GitHubError as e:
+                if not (e.is_rate_limited or e.is_timeout) or attempt == self.max_retries:
+                    raise
+                if e.is_timeout:
+                    self._shrink()
+                delay = self._backoff(attempt)
+                reason = "was rate limited" if e.is_rate_limited else "timed out"
+            else:
+                self._adapt(time.monotonic() - started)
+                self._wait_for_budget(data.get("rateLimit"))
+                return data
+
+            if attempt == self.max_retries:
+                raise GitHubError([{"message": f"Request {reason} too many times"}])
+            print(
+                f"Request {reason}, retrying in {delay:.1f}s"
+                f" with {self.batch_size} PRs per page",
+                file=sys.stderr,
+            )
+            time.sleep(delay)
+
+    def _shrink(self):
+        self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    def _adapt(self, elapsed):
+        if elapsed < self.fast_response:
+            self.batch_size = min(self.max_batch_size, self.batch_size * 3 // 2 + 1)
+        elif elapsed > self.slow_response:
+            self.batch_size = max(self.min_batch_size, self.batch_size * 3 // 4)
+
+    def _is_retryable(self, response):
+        if response.status_code == 403:
+            # A 403 is only worth retrying when it's a (secondary) rate limit
+            return bool(self._retry_after(response)) or "rate limit" in response.text
+        return response.status_code in RETRY_STATUSES
+
+    def _backoff(self, attempt):
+        # "Full jitter" keeps concurrent downloads from retrying in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    def _retry_after(self, response):
+        if "Retry-After" in response.headers:
+            retry_after = response.headers["Retry-After"]
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+            # Or it may be an HTTP date, and anything else is backed off from as usual
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                return None
+            return max(0.0, retry_at.timestamp() - time.time())
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = float(response.headers["X-RateLimit-Reset"])
+            return max(0.0, reset - time.time()) + self._backoff(0)
+        return None
+
+    def _wait_for_budget(self, rate_limit):
+        if not rate_limit or rate_limit["remaining"] >= rate_limit["cost"]:
+            return
+        delay = (arrow.get(rate_limit["resetAt"]) - arrow.utcnow()).total_seconds()
+        delay = max(0.0, delay) + self._backoff(0)
+        print(f"API budget used up, waiting {delay:.0f}s for it to reset", file=sys.stderr)
+        time.sleep(delay)
+
+
+def complete_timelines(session, scheduler, pull_requests):
+    """
+    Fetches the rest of the timeline of every PR that didn't fit in the first page.
+    The PRs are fetched together, so each round costs one request no matter how many
+    PRs still have timeline items left.
+    """
+    pending = [
+        pr for pr in pull_requests if pr["timelineItems"]["pageInfo"]["hasNextPage"]
+    ]
+    while pending:
+
+        def make_query(batch_size):
+            batch = pending[:batch_size]
+            variables = {}
+            for i, pr in enumerate(batch):
+                variables[f"id{i}"] = pr["id"]
+                variables[f"after{i}"] = pr["timelineItems"]["pageInfo"]["endCursor"]
+            return get_timeline_query(len(batch)), variables
+
+        data = scheduler.run(session, make_query)
+        for i, pr in enumerate(pending):
+            if f"pr{i}" not in data:
+                break
+            timeline = pr["timelineItems"]
+            # A PR that was deleted in the meantime comes back as null
+            page = (data[f"pr{i}"] or {}).get("timelineItems")
+            if not page:
+                timeline["pageInfo"]["hasNextPage"] = False
+                continue
+            timeline["nodes"].extend(page["nodes"])
+            timeline["pageInfo"] = page["pageInfo"]
+
+        pending = [pr for pr in pending if pr["timelineItems"]["pageInfo"]["hasNextPage"]]
+        if pending:
+            print(f"{len(pending)} pull requests have more timeline items", file=sys.stderr)
+
+
+def iter_pull_request_pages(
+    session,
+    repo_owner,
+    repo_name,
+    prs_per_batch=100,
+    too_old=None,
+    last_synced=None,
+    start_cursor=None,
+):
+    """
+    Pages backwards through the PRs of a repo, newest first, yielding each page once
+    its timelines are complete. When `last_synced` is given only the PRs updated since
+    then are returned, otherwise PRs are downloaded until they were created before
+    `too_old`. Paging starts from `start_cursor` when carrying on an earlier download.
+    """
+    scheduler = BatchScheduler(max_batch_size=prs_per_batch)
+    timeline_scheduler = BatchScheduler(max_batch_size=TIMELINE_PRS_PER_ROUND)
+    has_previous_page = True
+    loaded_count = 0
+
+    while has_previous_page:
+        variables = dict(
+            repoOwner=repo_owner,
+            repoName=repo_name,
+            prBefore=start_cursor,
+            orderField="UPDATED_AT" if last_synced else "CREATED_AT",
+        )
+        data = scheduler.run(
+            session, lambda batch_size: (QUERY, dict(variables, prCount=batch_size))
+        )
+
+        pull_requests = data["repository"]["pullRequests"]
+        start_cursor = pull_requests["pageInfo"]["startCursor"]
+        has_previous_page = pull_requests["pageInfo"]["hasPreviousPage"]
+        nodes = pull_requests["nodes"]
+        if not nodes:
+            continue
+
+        if last_synced:
+            # Pages come newest first, so once a page reaches back past the last sync
+            #  there is nothing older left to fetch.
+            if nodes[0]["updatedAt"] < last_synced:
+                has_previous_page = False
+            nodes = [node for node in nodes if node["updatedAt"] >= last_synced]
+        else:
+            pr = nodes[-1]
+            if too_old and arrow.get(pr["createdAt"]).datetime < too_old:
+                has_previous_page = False
+
+        complete_timelines(session, timeline_scheduler, nodes)
+        get_profiler().count("download", len(nodes))
+        loaded_count += len(nodes)
+        print(f"Loaded {loaded_count} pull requests from {repo_name}", file=sys.stderr)
+        yield PullRequestPage(nodes, start_cursor, has_previous_page)
+    else:
+        print(f"Loaded all pull requests from {repo_name} successfully", file=sys.stderr)
@@ -0,0 +1,21 @@
+import importlib.util
+import sys
+
+
+def load_module(name, filename):
+    """
+    Imports the Python file `filename` as a module called `name`, unless a module of
+    that name is already loaded, for scripts that can't be imported by name, such as
+    the reports', whose directories aren't packages and have hyphens in their names.
+
+    The module is registered in `sys.modules`, so its functions can be pickled. A
+    process pool's workers only find it by that name if they're forked, so pools
+    running its functions load it in each worker by passing this as the initializer.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,178 @@
+import atexit
+import cProfile
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:
+    # Only on Unix
+    resource = None
+
+
+class StageStats:
+    """
+    What a stage of a run took, summed over every time it ran, along with how many
+    items it handled, which the code running it adds to `items`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.items = 0
+        self.peak_rss_mib = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "items": int(self.items),
+            "peak_rss_mib": self.peak_rss_mib,
+        }
+
+
+class _StageTimer:
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        self.stats.calls += 1
+        self.stats.wall_seconds += time.perf_counter() - self.wall_start
+        self.stats.cpu_seconds += time.process_time() - self.cpu_start
+        self.stats.peak_rss_mib = get_peak_rss_mib()
+
+
+class _NoStage:
+    def __enter__(self):
+        # Somewhere for items to be counted that's thrown away
+        return StageStats(None)
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NO_STAGE = _NoStage()
+
+
+class Profiler:
+    """
+    Records the wall and CPU time, peak memory and item counts of the stages of a
+    run of `script`. Code runs a stage with `with profiler.stage(name) as stats:`,
+    and stages run more than once, such as each GitHub query, are summed. Stages can
+    be nested, so their times can overlap. Peak memory is that of the whole process
+    by the end of the stage, as the OS only keeps the one peak.
+
+    Unless `filename` is given nothing is recorded, and stages cost next to nothing.
+    Otherwise `finish` appends the run to it as a line of JSON. With
+    `cprofile_filename`, the whole run is also profiled with cProfile and its stats
+    dumped there, for pstats or snakeviz.
+    """
+
+    def __init__(self, script, filename=None, cprofile_filename=None):
+        self.script = script
+        self.filename = filename
+        self.cprofile_filename = cprofile_filename
+        self.stages = {}
+        self.started_at = datetime.now(timezone.utc)
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.cprofile = None
+        if cprofile_filename:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    @property
+    def enabled(self):
+        return self.filename is not None
+
+    def stage(self, name):
+        if not self.enabled:
+            return NO_STAGE
+        if name not in self.stages:
+            self.stages[name] = StageStats(name)
+        return _StageTimer(self.stages[name])
+
+    def count(self, name, items):
+        """
+        Adds to the items of stage `name` without timing anything.
+        """
+        if self.enabled:
+            if name not in self.stages:
+                self.stages[name] = StageStats(name)
+            self.stages[name].items += items
+
+    def to_dict(self):
+        return {
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": round(time.perf_counter() - self.wall_start, 6),
+            "cpu_seconds": round(time.process_time() - self.cpu_start, 6),
+            "peak_rss_mib": get_peak_rss_mib(),
+            "stages": [stats.to_dict() for stats in self.stages.values()],
+        }
+
+    def finish(self):
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_filename)
+            self.cprofile = None
+        if self.enabled:
+            with open(self.filename, "a") as fh:
+                fh.write(json.dumps(self.to_dict()) + "\n")
+            self.filename = None
+
+
+_profiler = Profiler(None)
+
+
+def get_profiler():
+    """
+    The profiler of this run, which records nothing unless `start_profiling` was
+    called, so library code can time its hot paths without being handed one.
+    """
+    return _profiler
+
+
+def start_profiling(script, args):
+    """
+    Starts profiling the run of `script` as the options `add_profile_arguments` added
+    to `args` ask, finishing when the process exits.
+    """
+    global _profiler
+    _profiler = Profiler(script, args.profile, args.cprofile)
+    atexit.register(_profiler.finish)
+    return _profiler
+
+
+def add_profile_arguments(parser):
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="append the time, memory and item counts of each stage of the run to"
+        " this JSON lines file",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="profile the run with cProfile and dump its stats to this file",
+    )
+
+
+def get_peak_rss_mib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives the peak in KiB, macOS in bytes
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
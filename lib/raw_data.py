@@ -0,0 +1,246 @@
+import gzip
+import io
+import json
+import os
+import re
+from itertools import chain
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from lib.timestamps import get_is_after
+
+RAW_DATA_EXTENSIONS = (".jsonl", ".json")
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".zst": "zstd"}
+TRANSFORMED_FILENAME = "transformed.json"
+
+# Timestamps in compact JSON that are in GitHub's form, found without parsing it. The
+#  quotes of keys in titles are escaped, so they don't match. Values in any other form
+#  match as an empty string.
+GITHUB_TIMESTAMP = r'(?:"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ)")?'
+CREATED_AT_PATTERN = re.compile(r'"createdAt":' + GITHUB_TIMESTAMP)
+EVENT_TIME_PATTERN = re.compile(r'"(?:createdAt|submittedAt)":' + GITHUB_TIMESTAMP)
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def get_compression(filename):
+    for extension, compression in COMPRESSION_EXTENSIONS.items():
+        if filename.endswith(extension):
+            return compression
+    return None
+
+
+def get_compression_extension(compression):
+    for extension, extension_compression in COMPRESSION_EXTENSIONS.items():
+        if compression == extension_compression:
+            return extension
+    return ""
+
+
+def get_repository_name(filename):
+    for extension in COMPRESSION_EXTENSIONS:
+        if filename.endswith(extension):
+            filename = filename[: -len(extension)]
+    for extension in RAW_DATA_EXTENSIONS:
+        if filename.endswith(extension):
+            return filename[: -len(extension)]
+    return filename
+
+
+def list_raw_files(directory):
+    # Hidden files hold the checkpoints of downloads that are still in progress
+    return sorted(
+        f
+        for f in os.listdir(directory)
+        if f != TRANSFORMED_FILENAME and not f.startswith(".")
+    )
+
+
+def read_raw_data(directory, repositories=None, created_after=None, active_after=None):
+    """
+    Maps the name of each repository with raw data in `directory`, or only those in
+    `repositories` if given, to an iterator over its PRs. PRs are only read from disk
+    as they are consumed, and skipped as `iter_pull_requests` describes.
+    """
+    return {
+        get_repository_name(f): iter_pull_requests(
+            os.path.join(directory, f),
+            created_after=created_after,
+            active_after=active_after,
+        )
+        for f in list_raw_files(directory)
+        if not repositories or get_repository_name(f) in repositories
+    }
+
+
+class PullRequestFilter:
+    """
+    Picks out the PRs created after `created_after`, and those created or with a
+    timeline event after `active_after`, where either may be None to not filter on
+    it. Compact JSON lines can be checked before they're parsed, for PRs in
+    GitHub's usual form.
+    """
+
+    def __init__(self, created_after=None, active_after=None):
+        self.is_created_after = created_after and get_is_after(created_after)
+        self.is_active_after = active_after and get_is_after(active_after)
+
+    def matches(self, pr):
+        if self.is_created_after and not self.is_created_after(pr.get("createdAt")):
+            return False
+        if self.is_active_after and not (
+            self.is_active_after(pr.get("createdAt"))
+            or any(
+                self.is_active_after(event.get("createdAt") or event.get("submittedAt"))
+                for event in pr["timelineItems"]["nodes"]
+            )
+        ):
+            return False
+        return True
+
+    def matches_line(self, line):
+        """
+        Whether the PR in the compact JSON `line` matches, or None if that can't be
+        told without parsing it.
+        """
+        matches = True
+        if self.is_created_after:
+            # The PR's own keys come before its timeline, if it has one
+            timeline = line.find('"timelineItems":')
+            match = CREATED_AT_PATTERN.search(
+                line, 0, timeline if timeline != -1 else len(line)
+            )
+            if not match or not match.group(1):
+                matches = None
+            elif not self.is_created_after(match.group(1)):
+                return False
+        if self.is_active_after:
+            timestamps = EVENT_TIME_PATTERN.findall(line)
+            if "" in timestamps:
+                matches = None
+            elif not self.is_active_after(max(timestamps, default="")):
+                return False
+        return matches
+
+
+def open_raw_file(filename, mode="r", compression=None):
+    """
+    Opens a raw data file as text. When reading, gzip and zstd compression are
+    detected from the contents of the file. When writing or appending, `compression`
+    is used, or otherwise worked out from the file extension.
+
+    Every time a compressed file is opened for appending a new gzip member or zstd
+    frame is started, and readers see the concatenation of all of them, so JSONL
+    segments can be added to a compressed file a page at a time.
+    """
+    if mode == "r":
+        return io.TextIOWrapper(_decompress(open(filename, "rb")), encoding="utf-8")
+
+    compression = compression or get_compression(filename)
+    if compression == "gzip":
+        return gzip.open(filename, mode + "t", encoding="utf-8")
+    if compression == "zstd":
+        _require_zstandard()
+        writer = zstandard.ZstdCompressor().stream_writer(open(filename, mode + "b"))
+        return io.TextIOWrapper(writer, encoding="utf-8")
+    return open(filename, mode)
+
+
+def _decompress(fh):
+    magic = fh.peek(len(ZSTD_MAGIC))[: len(ZSTD_MAGIC)]
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=fh)
+    if magic.startswith(ZSTD_MAGIC):
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True)
+    return fh
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("The zstandard package is needed for zstd compressed data")
+
+
+def iter_pull_requests(source, created_after=None, active_after=None):
+    """
+    Yields the PRs in a file written by download_data.py, one at a time. `source` is
+    either a filename or an open file, and may be gzip or zstd compressed. JSONL files
+    are read a line at a time, while files holding a single JSON list are loaded in
+    one go.
+
+    With `created_after` or `active_after`, only the PRs that `PullRequestFilter`
+    picks are yielded, and JSONL lines of those that aren't are mostly skipped
+    without being parsed.
+    """
+    if isinstance(source, str):
+        with open_raw_file(source) as fh:
+            yield from iter_pull_requests(fh, created_after, active_after)
+        return
+    if not isinstance(source, io.TextIOBase):
+        source = io.TextIOWrapper(_decompress(source), encoding="utf-8")
+    pr_filter = None
+    if created_after or active_after:
+        pr_filter = PullRequestFilter(created_after, active_after)
+
+    first_line = source.readline()
+    if first_line.lstrip().startswith("["):
+        pull_requests = json.loads(first_line + source.read())
+        if pr_filter:
+            pull_requests = filter(pr_filter.matches, pull_requests)
+        yield from pull_requests
+        return
+    for line in chain([first_line], source):
+        if not line.strip():
+            continue
+        if not pr_filter:
+            yield json.loads(line)
+            continue
+        matches = pr_filter.matches_line(line)
+        if matches is False:
+            continue
+        pr = json.loads(line)
+        if matches or pr_filter.matches(pr):
+            yield pr
+
+
+def iter_pull_request_lines(filename, created_after=None, active_after=None):
+    """
+    Yields each PR in a raw data file as compact JSON, the way JSONL files store them,
+    along with the PR itself if it had to be parsed to get there or otherwise None.
+    JSONL lines are passed through without being parsed where they can be. PRs are
+    skipped as `iter_pull_requests` describes.
+    """
+    pr_filter = None
+    if created_after or active_after:
+        pr_filter = PullRequestFilter(created_after, active_after)
+    with open_raw_file(filename) as fh:
+        first_line = fh.readline()
+        if first_line.lstrip().startswith("["):
+            for pr in json.loads(first_line + fh.read()):
+                if not pr_filter or pr_filter.matches(pr):
+                    yield dump_pull_request(pr), pr
+            return
+        for line in chain([first_line], fh):
+            line = line.strip()
+            if not line:
+                continue
+            matches = pr_filter.matches_line(line) if pr_filter else True
+            if matches:
+                yield line, None
+            elif matches is None:
+                pr = json.loads(line)
+                if pr_filter.matches(pr):
+                    yield line, pr
+
+
+def dump_pull_request(pr):
+    return json.dumps(pr, separators=(",", ":"))
+
+
+def write_pull_requests_jsonl(pull_requests, fh):
+    for pr in pull_requests:
+        fh.write(dump_pull_request(pr) + "\n")
@@ -0,0 +1,260 @@
+import sqlite3
+
+import numpy as np
+
+from lib.events import NO_LOGIN, NO_TIME, EventTable, Interner
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repositories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    login TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS pull_requests (
+    id INTEGER PRIMARY KEY,
+    repository INTEGER NOT NULL REFERENCES repositories (id),
+    title TEXT NOT NULL,
+    author INTEGER REFERENCES users (id),
+    created_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS pull_requests_repository
+    ON pull_requests (repository, created_at);
+CREATE INDEX IF NOT EXISTS pull_requests_created_at ON pull_requests (created_at);
+CREATE TABLE IF NOT EXISTS events (
+    pull_request INTEGER NOT NULL REFERENCES pull_requests (id),
+    position INTEGER NOT NULL,
+    type INTEGER NOT NULL,
+    user INTEGER REFERENCES users (id),
+    time INTEGER,
+    PRIMARY KEY (pull_request, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS events_user ON events (user, time);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+"""
+
+
+class RawStore:
+    """
+    The downloaded PRs in an SQLite file, normalised into repositories, users, PRs and
+    their timeline events, with events indexed by user and time. Reports that only
+    need some repositories, reviewers or a recent window can then load just those
+    rows into an `EventTable`, rather than reading every raw data file.
+
+    Timestamps are epoch seconds, and missing ones are NULL. Events with no user,
+    such as closes and requests of teams, have a NULL user.
+    """
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def import_events(self, events):
+        """
+        Stores the PRs of the `EventTable` `events`, replacing everything stored for
+        each of its repositories, as each raw data file holds all of a repository.
+        """
+        with self.connection:
+            repository_ids = self._get_ids("repositories", "name", events.repositories)
+            user_ids = self._get_ids("users", "login", events.logins)
+            # A missing login or timestamp becomes NULL
+            user_ids.append(None)
+            for repository in repository_ids:
+                self.connection.execute(
+                    "DELETE FROM events WHERE pull_request IN"
+                    " (SELECT id FROM pull_requests WHERE repository = ?)",
+                    (repository,),
+                )
+                self.connection.execute(
+                    "DELETE FROM pull_requests WHERE repository = ?", (repository,)
+                )
+
+            (first_id,) = self.connection.execute(
+                "SELECT COALESCE(MAX(id), 0) + 1 FROM pull_requests"
+            ).fetchone()
+            pr_ids = range(first_id, first_id + events.pr_count)
+            self.connection.executemany(
+                "INSERT INTO pull_requests (id, repository, title, author, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                zip(
+                    pr_ids,
+                    [repository_ids[i] for i in events.pr_repository.tolist()],
+                    events.titles,
+                    [user_ids[i] for i in events.pr_author.tolist()],
+                    _to_nullable_times(events.pr_created),
+                ),
+            )
+
+            event_counts = np.diff(events.event_offsets)
+            event_prs = np.repeat(np.array(pr_ids, dtype=np.int64), event_counts)
+            positions = np.arange(events.event_count) - np.repeat(
+                events.event_offsets[:-1], event_counts
+            )
+            self.connection.executemany(
+                "INSERT INTO events (pull_request, position, type, user, time)"
+                " VALUES (?, ?, ?, ?, ?)",
+                zip(
+                    event_prs.tolist(),
+                    positions.tolist(),
+                    events.event_type.tolist(),
+                    [user_ids[i] for i in events.event_login.tolist()],
+                    _to_nullable_times(events.event_time),
+                ),
+            )
+
+    def _get_ids(self, table, column, values):
+        self.connection.executemany(
+            f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)",
+            [(value,) for value in values],
+        )
+        ids = dict(self.connection.execute(f"SELECT {column}, id FROM {table}"))
+        return [ids[value] for value in values]
+
+    def load_events(
+        self,
+        repositories=None,
+        reviewers=None,
+        since=None,
+        until=None,
+        created_after=None,
+    ):
+        """
+        Loads the stored PRs into an `EventTable`, only reading the rows of those that
+        match every filter given:
+
+        - `repositories`: PRs in one of these repositories
+        - `reviewers`: PRs one of these users has requested, removed or review events
+          on; only their events and those without a user are loaded
+        - `since` and `until`: PRs with any such event after `since` and before
+          `until`, aware datetimes
+        - `created_after`: PRs created after this aware datetime
+
+        PRs come in order of repository name, and then in the order they were stored.
+        """
+        conditions, parameters = [], []
+        if repositories is not None:
+            placeholders = ",".join("?" * len(repositories))
+            conditions.append(
+                "pull_requests.repository IN (SELECT id FROM repositories"
+                f" WHERE name IN ({placeholders}))"
+            )
+            parameters.extend(repositories)
+        user_condition = ""
+        user_parameters = []
+        if reviewers is not None:
+            placeholders = ",".join("?" * len(reviewers))
+            user_condition = (
+                "events.user IN"
+                f" (SELECT id FROM users WHERE login IN ({placeholders}))"
+            )
+            user_parameters = list(reviewers)
+        if since is not None or until is not None or reviewers is not None:
+            event_conditions = [user_condition] if user_condition else []
+            event_parameters = list(user_parameters)
+            if since is not None:
+                event_conditions.append("events.time > ?")
+                event_parameters.append(int(since.timestamp()))
+            if until is not None:
+                event_conditions.append("events.time < ?")
+                event_parameters.append(int(until.timestamp()))
+            conditions.append(
+                "pull_requests.id IN (SELECT pull_request FROM events WHERE "
+                + " AND ".join(event_conditions)
+                + ")"
+            )
+            parameters.extend(event_parameters)
+        if created_after is not None:
+            conditions.append("pull_requests.created_at > ?")
+            parameters.append(int(created_after.timestamp()))
+
+        self.connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS selected_pull_requests"
+            " (position INTEGER PRIMARY KEY, id INTEGER NOT NULL)"
+        )
+        self.connection.execute("DELETE FROM selected_pull_requests")
+        self.connection.execute(
+            "INSERT INTO selected_pull_requests (id) SELECT pull_requests.id"
+            " FROM pull_requests JOIN repositories"
+            " ON repositories.id = pull_requests.repository"
+            + (" WHERE " + " AND ".join(conditions) if conditions else "")
+            + " ORDER BY repositories.name, pull_requests.id",
+            parameters,
+        )
+
+        pull_requests = self.connection.execute(
+            "SELECT repositories.name, pull_requests.title, users.login,"
+            " pull_requests.created_at FROM selected_pull_requests"
+            " JOIN pull_requests ON pull_requests.id = selected_pull_requests.id"
+            " JOIN repositories ON repositories.id = pull_requests.repository"
+            " LEFT JOIN users ON users.id = pull_requests.author"
+            " ORDER BY selected_pull_requests.position"
+        ).fetchall()
+        events = self.connection.execute(
+            "SELECT selected_pull_requests.position, events.type, users.login,"
+            " events.time FROM selected_pull_requests"
+            " JOIN events ON events.pull_request = selected_pull_requests.id"
+            " LEFT JOIN users ON users.id = events.user"
+            # Closes and merges have no user
+            + (
+                f" WHERE ({user_condition} OR events.user IS NULL)"
+                if user_condition
+                else ""
+            )
+            + " ORDER BY selected_pull_requests.position, events.position",
+            user_parameters,
+        ).fetchall()
+        return _to_event_table(pull_requests, events)
+
+    def close(self):
+        self.connection.close()
+
+
+def _to_nullable_times(epochs):
+    return [None if epoch == NO_TIME else epoch for epoch in epochs.tolist()]
+
+
+def _to_event_table(pull_requests, events):
+    logins = Interner()
+    repositories = Interner()
+
+    def get_login(login):
+        return NO_LOGIN if login is None else logins(login)
+
+    pr_repository, titles, pr_author, pr_created = [], [], [], []
+    for repository, title, author, created in pull_requests:
+        pr_repository.append(repositories(repository))
+        titles.append(title)
+        pr_author.append(get_login(author))
+        pr_created.append(NO_TIME if created is None else created)
+
+    event_pr, event_type, event_login, event_time = [], [], [], []
+    for pr, type_, login, time in events:
+        # The positions of the selected PRs start from 1
+        event_pr.append(pr - 1)
+        event_type.append(type_)
+        event_login.append(get_login(login))
+        event_time.append(NO_TIME if time is None else time)
+    event_offsets = np.zeros(len(pull_requests) + 1, dtype=np.int64)
+    np.cumsum(
+        np.bincount(
+            np.array(event_pr, dtype=np.int64), minlength=len(pull_requests)
+        ),
+        out=event_offsets[1:],
+    )
+
+    return EventTable(
+        logins=logins.strings,
+        repositories=repositories.strings,
+        titles=titles,
+        pr_repository=np.array(pr_repository, dtype=np.int32),
+        pr_author=np.array(pr_author, dtype=np.int32),
+        pr_created=np.array(pr_created, dtype=np.int64),
+        event_offsets=event_offsets,
+        event_type=np.array(event_type, dtype=np.int8),
+        event_login=np.array(event_login, dtype=np.int32),
+        event_time=np.array(event_time, dtype=np.int64),
+    )
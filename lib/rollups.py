@@ -0,0 +1,153 @@
+import hashlib
+import json
+import sqlite3
+from collections import defaultdict
+from datetime import date
+from typing import NamedTuple
+
+from lib.sketches import DurationSketch
+
+# Bump whenever the way reviews are counted changes, so old rows aren't reused
+ROLLUP_VERSION = 2
+
+
+class ReviewCounts(NamedTuple):
+    requested: int
+    actioned: int
+    actioned_within_target: int
+    expected: int
+    # The business time to action them, summed over the actioned reviews
+    duration_seconds: int
+
+
+class ReviewRollups:
+    """
+    Counts of each reviewer's reviews by the UTC day they were requested on, kept in
+    an SQLite file so the stats for a rolling window are a sum over its days rather
+    than a pass over every review in it.
+
+    Rows are kept under a digest of `settings`, which should hold everything the
+    counts depend on, such as the target review time and working hours, so changing
+    any of them starts afresh. Each day also records when it was counted, so callers
+    can tell days that were still in progress or had reviews outstanding.
+
+    Alongside the counts, each day can hold a `DurationSketch` of the durations of
+    the reviews of each reviewer, repository or author, which are merged over the
+    days of a window to estimate its percentiles.
+    """
+
+    def __init__(self, filename, settings):
+        self.settings = hashlib.blake2b(
+            json.dumps([ROLLUP_VERSION, settings], sort_keys=True).encode("utf-8"),
+            digest_size=20,
+        ).hexdigest()
+        self.connection = sqlite3.connect(filename, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS days (settings TEXT NOT NULL,"
+            " day TEXT NOT NULL, counted_at REAL NOT NULL,"
+            " PRIMARY KEY (settings, day))"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS reviewer_days (settings TEXT NOT NULL,"
+            " day TEXT NOT NULL, reviewer TEXT NOT NULL, requested INTEGER NOT NULL,"
+            " actioned INTEGER NOT NULL, actioned_within_target INTEGER NOT NULL,"
+            " expected INTEGER NOT NULL, duration_seconds INTEGER NOT NULL,"
+            " PRIMARY KEY (settings, day, reviewer))"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS day_sketches (settings TEXT NOT NULL,"
+            " day TEXT NOT NULL, kind TEXT NOT NULL, name TEXT NOT NULL,"
+            " sketch TEXT NOT NULL, PRIMARY KEY (settings, day, kind, name))"
+        )
+
+    def get_days(self, first_day, last_day):
+        """
+        Maps each day from `first_day` to `last_day` that has been counted to when it
+        was counted, in epoch seconds, and how many of its reviews weren't actioned.
+        """
+        rows = self.connection.execute(
+            "SELECT days.day, days.counted_at,"
+            " COALESCE(SUM(requested - actioned), 0) FROM days"
+            " LEFT JOIN reviewer_days ON reviewer_days.settings = days.settings"
+            " AND reviewer_days.day = days.day"
+            " WHERE days.settings = ? AND days.day BETWEEN ? AND ?"
+            " GROUP BY days.day",
+            (self.settings, first_day.isoformat(), last_day.isoformat()),
+        )
+        return {
+            date.fromisoformat(day): (counted_at, unactioned)
+            for day, counted_at, unactioned in rows
+        }
+
+    def put_days(self, days, counts, counted_at, sketches=None):
+        """
+        Replaces the rows of each of `days` with `counts`, which maps `(day, reviewer)`
+        to their `ReviewCounts`, marking the days as counted at the epoch seconds
+        `counted_at`. Days without any counts are stored as having no reviews.
+
+        `sketches` maps `(day, kind, name)` to a `DurationSketch`, where `kind` says
+        what `name` is, such as "reviewer" or "repository".
+        """
+        days = [day.isoformat() for day in days]
+        with self.connection:
+            for table in ("reviewer_days", "day_sketches"):
+                self.connection.executemany(
+                    f"DELETE FROM {table} WHERE settings = ? AND day = ?",
+                    [(self.settings, day) for day in days],
+                )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO days (settings, day, counted_at)"
+                " VALUES (?, ?, ?)",
+                [(self.settings, day, counted_at) for day in days],
+            )
+            self.connection.executemany(
+                "INSERT INTO reviewer_days VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (self.settings, day.isoformat(), reviewer, *reviewer_counts)
+                    for (day, reviewer), reviewer_counts in counts.items()
+                ],
+            )
+            self.connection.executemany(
+                "INSERT INTO day_sketches VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.settings, day.isoformat(), kind, name, sketch.dumps())
+                    for (day, kind, name), sketch in (sketches or {}).items()
+                ],
+            )
+
+    def get_totals(self, first_day, last_day):
+        """
+        Maps each reviewer to their `ReviewCounts` summed over the days from
+        `first_day` to `last_day`.
+        """
+        rows = self.connection.execute(
+            "SELECT reviewer, SUM(requested), SUM(actioned),"
+            " SUM(actioned_within_target), SUM(expected), SUM(duration_seconds)"
+            " FROM reviewer_days WHERE settings = ? AND day BETWEEN ? AND ?"
+            " GROUP BY reviewer ORDER BY reviewer",
+            (self.settings, first_day.isoformat(), last_day.isoformat()),
+        )
+        return {reviewer: ReviewCounts(*counts) for reviewer, *counts in rows}
+
+    def get_sketches(self, first_day, last_day):
+        """
+        Maps each kind of sketch to a map of each name to its `DurationSketch` merged
+        over the days from `first_day` to `last_day`.
+        """
+        rows = self.connection.execute(
+            "SELECT kind, name, sketch FROM day_sketches"
+            " WHERE settings = ? AND day BETWEEN ? AND ?",
+            (self.settings, first_day.isoformat(), last_day.isoformat()),
+        )
+        sketches = defaultdict(dict)
+        for kind, name, data in rows:
+            sketch = DurationSketch.loads(data)
+            if name in sketches[kind]:
+                sketches[kind][name].merge(sketch)
+            else:
+                sketches[kind][name] = sketch
+        return sketches
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,108 @@
+import json
+import math
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Enough bins to cover a second to over a century at the default accuracy, so they
+#  only collapse for far coarser durations than reviews take
+DEFAULT_MAX_BINS = 2048
+
+
+class DurationSketch:
+    """
+    A DDSketch style summary of durations in seconds, for estimating their quantiles
+    without keeping them. Values are counted in bins whose bounds grow geometrically,
+    so every quantile is within `relative_accuracy` of the exact one, and the memory
+    used depends on the range of the values rather than how many there are.
+
+    Sketches with the same accuracy can be merged, giving the same sketch as adding
+    both sets of values to one. Values under a second are counted as zero. Past
+    `max_bins`, the lowest bins are folded together, so only the lowest quantiles
+    lose accuracy.
+    """
+
+    def __init__(
+        self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_bins=DEFAULT_MAX_BINS
+    ):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        # Bin `k` counts the values in `(gamma ** (k - 1), gamma ** k]`
+        self.bins = {}
+        self.count = 0
+
+    def add(self, value):
+        if value < 1:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+            self._collapse()
+        self.count += 1
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        non_zero = values[values >= 1]
+        keys, counts = np.unique(
+            np.ceil(np.log(non_zero) / self.log_gamma).astype(np.int64),
+            return_counts=True,
+        )
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += len(values) - len(non_zero)
+        self.count += len(values)
+        self._collapse()
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same accuracy can be merged")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self._collapse()
+
+    def _collapse(self):
+        if len(self.bins) <= self.max_bins:
+            return
+        keys = sorted(self.bins)
+        lowest = keys[len(keys) - self.max_bins]
+        for key in keys[: len(keys) - self.max_bins]:
+            self.bins[lowest] += self.bins.pop(key)
+
+    def quantile(self, q):
+        """
+        The estimated `q` quantile, for `q` from 0 to 1, or None if there are no
+        values. It estimates the value ranked `floor(q * (count - 1))` from the
+        lowest.
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if cumulative > rank:
+            return 0.0
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative > rank:
+                break
+        # The point of the bin with the same relative error to both its bounds
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def dumps(self):
+        return json.dumps(
+            [self.relative_accuracy, self.zero_count, sorted(self.bins.items())],
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def loads(cls, data, max_bins=DEFAULT_MAX_BINS):
+        relative_accuracy, zero_count, bins = json.loads(data)
+        sketch = cls(relative_accuracy, max_bins)
+        sketch.zero_count = zero_count
+        sketch.bins = {key: count for key, count in bins}
+        sketch.count = zero_count + sum(sketch.bins.values())
+        return sketch
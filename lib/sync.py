@@ -0,0 +1,150 @@
+import json
+import os
+import sys
+
+from lib.checkpoint import Checkpoint
+from lib.github import iter_pull_request_pages
+from lib.raw_data import *
+
+
+def get_sync_key(repo_owner, repo_name):
+    return f"{repo_owner}/{repo_name}"
+
+
+def load_sync_state(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file) as fh:
+        return json.load(fh)
+
+
+def save_sync_state(state_file, state):
+    state_dir = os.path.dirname(state_file)
+    if state_dir and not os.path.isdir(state_dir):
+        os.makedirs(state_dir)
+    with open(state_file, "w") as fh:
+        fh.write(json.dumps(state, indent=2, sort_keys=True) + "\n")
+
+
+def get_last_updated(pull_requests, last_updated=None):
+    # GitHub timestamps are all in the same fixed UTC format so they sort as strings
+    timestamps = [pr["updatedAt"] for pr in pull_requests]
+    if last_updated:
+        timestamps.append(last_updated)
+    return max(timestamps, default=None)
+
+
+def can_merge(pull_requests):
+    # Files downloaded before PR ids were requested can't be merged into safely
+    return all("id" in pr for pr in pull_requests)
+
+
+def merge_pull_requests(existing, updated):
+    """
+    Replaces PRs in `existing` with their version from `updated`, matching on the
+    PR node id, and appends any PRs that weren't seen before.
+    """
+    merged = {pr["id"]: pr for pr in existing}
+    for pr in updated:
+        merged[pr["id"]] = pr
+    return list(merged.values())
+
+
+def sync_repository(
+    session,
+    repo_owner,
+    repo_name,
+    output_file=None,
+    last_synced=None,
+    prs_per_batch=100,
+    too_old=None,
+    jsonl=False,
+    resume=False,
+):
+    """
+    Downloads the PRs of a repo and writes them to `output_file`, or stdout if it's
+    omitted. When `last_synced` is given and the output file can be merged into, only
+    the PRs updated since then are downloaded. With `jsonl` every PR is written as one
+    line rather than in one go at the end.
+
+    Downloads to a file are checkpointed after every page, and with `resume` an
+    interrupted download carries on from its last complete page.
+    Returns the new sync point of the repo.
+    """
+    existing_nodes = None
+    if last_synced and output_file and os.path.exists(output_file):
+        existing_nodes = list(iter_pull_requests(output_file))
+    if last_synced and (existing_nodes is None or not can_merge(existing_nodes)):
+        print(
+            f"Can't merge into the output of {repo_name}, downloading in full",
+            file=sys.stderr,
+        )
+        last_synced = None
+
+    if not output_file:
+        return _stream_repository(
+            session, repo_owner, repo_name, prs_per_batch, too_old, jsonl
+        )
+
+    repo = get_sync_key(repo_owner, repo_name)
+    checkpoint = Checkpoint(output_file)
+    if resume and checkpoint.resume(repo, last_synced):
+        print(
+            f"Resuming {repo_name} after {checkpoint.state['count']} pull requests",
+            file=sys.stderr,
+        )
+    else:
+        checkpoint.start(repo, last_synced)
+
+    if not checkpoint.is_complete:
+        pages = iter_pull_request_pages(
+            session,
+            repo_owner,
+            repo_name,
+            prs_per_batch=prs_per_batch,
+            too_old=too_old,
+            last_synced=last_synced,
+            start_cursor=checkpoint.cursor,
+        )
+        for page in pages:
+            checkpoint.add_page(page, get_last_updated(page.nodes, checkpoint.last_updated))
+
+    if last_synced:
+        nodes = list(checkpoint.iter_pull_requests())
+        print(f"Merging {len(nodes)} updated pull requests", file=sys.stderr)
+        nodes = merge_pull_requests(existing_nodes, nodes)
+        _write_output(nodes, output_file, jsonl)
+    elif jsonl:
+        # The partial file already holds the output, so it only needs moving into place
+        os.replace(checkpoint.partial_file, output_file)
+    else:
+        _write_output(list(checkpoint.iter_pull_requests()), output_file, jsonl)
+    checkpoint.finish()
+    return max(filter(None, [last_synced, checkpoint.last_updated]), default=None)
+
+
+def _stream_repository(session, repo_owner, repo_name, prs_per_batch, too_old, jsonl):
+    pages = iter_pull_request_pages(
+        session, repo_owner, repo_name, prs_per_batch=prs_per_batch, too_old=too_old
+    )
+    if jsonl:
+        for page in pages:
+            write_pull_requests_jsonl(page.nodes, sys.stdout)
+            sys.stdout.flush()
+    else:
+        nodes = [pr for page in pages for pr in page.nodes]
+        sys.stdout.write(json.dumps(nodes, indent=2) + "\n")
+
+
+def _write_output(nodes, output_file, jsonl):
+    # Writing next to the output and moving it into place keeps the old file intact
+    #  if anything goes wrong half way through
+    temporary_file = os.path.join(
+        os.path.dirname(output_file), f".{os.path.basename(output_file)}.tmp"
+    )
+    with open_raw_file(temporary_file, "w", get_compression(output_file)) as fh:
+        if jsonl:
+            write_pull_requests_jsonl(nodes, fh)
+        else:
+            fh.write(json.dumps(nodes, indent=2) + "\n")
+    os.replace(temporary_file, output_file)
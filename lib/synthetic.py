@@ -0,0 +1,215 @@
+import math
+import random
+from datetime import datetime, time, timedelta, timezone
+
+from lib.timestamps import format_timestamp
+
+# Bump whenever the PRs generated from the same settings change
+GENERATOR_VERSION = 1
+# How PRs tend to go, roughly in line with the TypeScript data in data/
+REQUESTED_REVIEWER_COUNTS = {1: 0.5, 2: 0.35, 3: 0.15}
+REVIEW_STATES = {"APPROVED": 0.6, "COMMENTED": 0.25, "CHANGES_REQUESTED": 0.15}
+TEAM_REQUEST_RATE = 0.1
+RESPONSE_RATE = 0.85
+REQUEST_REMOVED_RATE = 0.05
+DRIVE_BY_REVIEW_RATE = 0.1
+MAX_REVIEW_CYCLES = 4
+# Median delays, which are spread log-normally
+MEDIAN_REVIEW_DELAY = timedelta(hours=3)
+MEDIAN_FIX_DELAY = timedelta(hours=20)
+MEDIAN_RESOLUTION_DELAY = timedelta(hours=6)
+RESOLUTIONS = {"merged": 0.75, "closed": 0.15, "open": 0.1}
+# Most activity is on weekdays from 9:00 to 17:30 UTC, and what would happen out of
+#  hours mostly waits for the start of the next working day
+WORKING_HOURS = (time(hour=9), time(hour=17, minute=30))
+OUT_OF_HOURS_RATE = 0.15
+DEPENDABOT_RATE = 0.05
+DEPENDABOT_LOGIN = "dependabot[bot]"
+
+
+def get_logins(prefix, count):
+    return [f"{prefix}{i:03d}" for i in range(count)]
+
+
+class PullRequestGenerator:
+    """
+    Makes up PRs in the shape download_data.py writes them, with review requests,
+    reviews over several cycles, removed requests, team requests and merges or
+    closes, spread over the `days` before `end`. Some reviewers and authors are far
+    busier than others, as in real repositories.
+
+    The same `seed` always gives the same PRs for each repository, whichever order
+    the repositories are made in.
+    """
+
+    def __init__(self, reviewers, authors, teams, end, days, seed=0):
+        self.reviewers = reviewers
+        self.authors = authors
+        self.teams = teams
+        self.end = end
+        self.start = end - timedelta(days=days)
+        self.seed = seed
+        # Zipf-like weights, so the first few do much of the work
+        self.reviewer_weights = _get_zipf_weights(len(reviewers))
+        self.author_weights = _get_zipf_weights(len(authors))
+
+    def generate(self, repository, count):
+        """
+        Yields `count` PRs in `repository`, in order of creation.
+        """
+        rng = random.Random(f"{self.seed}:{repository}")
+        span = (self.end - self.start).total_seconds()
+        offsets = sorted(rng.random() * span for _ in range(count))
+        for number, offset in enumerate(offsets):
+            created = _get_working_time(
+                rng, self.start + timedelta(seconds=int(offset))
+            )
+            yield self._generate_pull_request(rng, repository, number, created)
+
+    def _generate_pull_request(self, rng, repository, number, created):
+        if rng.random() < DEPENDABOT_RATE:
+            author = DEPENDABOT_LOGIN
+        else:
+            author = rng.choices(self.authors, self.author_weights)[0]
+        nodes = []
+        last_activity = created
+
+        requested = set()
+        requested_count = min(
+            _choose(rng, REQUESTED_REVIEWER_COUNTS),
+            len(set(self.reviewers) - {author}),
+        )
+        while len(requested) < requested_count:
+            reviewer = rng.choices(self.reviewers, self.reviewer_weights)[0]
+            if reviewer != author:
+                requested.add(reviewer)
+        if self.teams and rng.random() < TEAM_REQUEST_RATE:
+            team = rng.choice(self.teams)
+            nodes.append(_request_event("ReviewRequestedEvent", created, name=team))
+
+        for reviewer in sorted(requested):
+            request = created + timedelta(seconds=rng.randrange(120))
+            for _ in range(MAX_REVIEW_CYCLES):
+                nodes.append(
+                    _request_event("ReviewRequestedEvent", request, login=reviewer)
+                )
+                if rng.random() < REQUEST_REMOVED_RATE:
+                    removed = _get_working_time(
+                        rng, request + _get_delay(rng, MEDIAN_REVIEW_DELAY)
+                    )
+                    nodes.append(
+                        _request_event("ReviewRequestRemovedEvent", removed, reviewer)
+                    )
+                    last_activity = max(last_activity, removed)
+                    break
+                if rng.random() >= RESPONSE_RATE:
+                    break
+                submitted = _get_working_time(
+                    rng, request + _get_delay(rng, MEDIAN_REVIEW_DELAY)
+                )
+                state = _choose(rng, REVIEW_STATES)
+                nodes.append(_review(submitted, reviewer, state))
+                last_activity = max(last_activity, submitted)
+                if state == "APPROVED":
+                    break
+                # The author pushes a fix and asks again
+                request = _get_working_time(
+                    rng, submitted + _get_delay(rng, MEDIAN_FIX_DELAY)
+                )
+
+        # Someone who wasn't asked to review chips in
+        reviewer = rng.choices(self.reviewers, self.reviewer_weights)[0]
+        if rng.random() < DRIVE_BY_REVIEW_RATE and reviewer not in requested | {author}:
+            submitted = _get_working_time(
+                rng, created + _get_delay(rng, MEDIAN_REVIEW_DELAY)
+            )
+            nodes.append(_review(submitted, reviewer, "COMMENTED"))
+            last_activity = max(last_activity, submitted)
+
+        resolution = _choose(rng, RESOLUTIONS)
+        resolved = _get_working_time(
+            rng, last_activity + _get_delay(rng, MEDIAN_RESOLUTION_DELAY)
+        )
+        if resolution == "merged":
+            nodes.append({"__typename": "MergedEvent", "createdAt": resolved})
+            nodes.append({"__typename": "ClosedEvent", "createdAt": resolved})
+        elif resolution == "closed":
+            nodes.append({"__typename": "ClosedEvent", "createdAt": resolved})
+
+        # Nothing can have happened after the data was downloaded
+        nodes = [node for node in nodes if _get_time(node) <= self.end]
+        nodes.sort(key=_get_time)
+        updated = max([_get_time(node) for node in nodes], default=created)
+        for node in nodes:
+            key = "submittedAt" if "submittedAt" in node else "createdAt"
+            node[key] = format_timestamp(node[key])
+        return {
+            "title": f"Synthetic change {number} to {repository}",
+            "timelineItems": {"nodes": nodes},
+            "id": f"PR_{repository}_{number}",
+            "createdAt": format_timestamp(created),
+            "updatedAt": format_timestamp(updated),
+            "baseRepository": {"name": repository},
+            "author": {"login": author},
+        }
+
+
+def get_default_end():
+    return datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _get_zipf_weights(count):
+    return [1 / (rank + 1) for rank in range(count)]
+
+
+def _choose(rng, weights):
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+
+def _get_delay(rng, median):
+    # Whole seconds, as GitHub's timestamps are
+    seconds = median.total_seconds() * math.exp(rng.gauss(0, 1.2))
+    return timedelta(seconds=max(1, round(seconds)))
+
+
+def _get_working_time(rng, moment):
+    """
+    `moment`, or mostly if it's out of hours, a little after the start of the next
+    working day.
+    """
+    start, end = WORKING_HOURS
+    is_weekday = moment.weekday() < 5
+    if (is_weekday and start <= moment.time() < end) or (
+        rng.random() < OUT_OF_HOURS_RATE
+    ):
+        return moment
+    day = moment.date()
+    if is_weekday and moment.time() >= start:
+        day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return datetime.combine(day, start, moment.tzinfo) + timedelta(
+        seconds=rng.randrange(2 * 60 * 60)
+    )
+
+
+def _get_time(node):
+    return node.get("createdAt") or node.get("submittedAt")
+
+
+def _request_event(typename, time, login=None, name=None):
+    requested_reviewer = {"login": login} if login else {"name": name}
+    return {
+        "__typename": typename,
+        "createdAt": time,
+        "requestedReviewer": requested_reviewer,
+    }
+
+
+def _review(time, login, state):
+    return {
+        "__typename": "PullRequestReview",
+        "state": state,
+        "submittedAt": time,
+        "author": {"login": login},
+    }
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from arrow.parser import TzinfoParser
+from dateutil import parser
+
+from lib.events import TIMESTAMP_FORMAT
+
+SECONDS_PER_HOUR = 60 * 60
+
+
+def is_github_timestamp(timestamp):
+    """
+    Whether `timestamp` is in the `YYYY-MM-DDTHH:MM:SSZ` form GitHub always sends,
+    where comparing the strings compares the times.
+    """
+    # Every third character from the fifth is a separator
+    return len(timestamp) == 20 and timestamp[4::3] == "--T::Z"
+
+
+def parse_timestamp(timestamp):
+    """
+    Parses a timestamp from GitHub into an aware UTC datetime. GitHub always sends
+    `YYYY-MM-DDTHH:MM:SSZ`, which is read with a fixed format fast path, and anything
+    else falls back to dateutil.
+    """
+    if is_github_timestamp(timestamp):
+        try:
+            return datetime.fromisoformat(timestamp[:19]).replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return parser.parse(timestamp)
+
+
+def format_timestamp(time):
+    """
+    Formats an aware datetime the way GitHub does, dropping any fraction of a second.
+    """
+    return time.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def get_is_after(after):
+    """
+    A function telling whether a timestamp from GitHub is later than the aware
+    datetime `after`. Timestamps in GitHub's form are compared as strings without
+    being parsed, which as they're whole seconds is the same as comparing them with
+    `after` rounded down to the second. Missing timestamps are never later.
+    """
+    after_string = format_timestamp(after)
+
+    def is_after(timestamp):
+        if not timestamp:
+            return False
+        if is_github_timestamp(timestamp):
+            return timestamp > after_string
+        return parse_timestamp(timestamp) > after
+
+    return is_after
+
+
+class UtcOffsetCache:
+    """
+    Converts UTC times into the timezone `tz`, remembering the UTC offset of every hour
+    it has seen so the zone's rules are consulted once an hour rather than once a
+    timestamp. Hours that hold a transition aren't cached, and their timestamps are
+    looked up exactly.
+    """
+
+    def __init__(self, tz):
+        self.tzinfo = TzinfoParser.parse(tz) if isinstance(tz, str) else tz
+        self.hours = {}
+
+    def _get_hour(self, hour):
+        if hour not in self.hours:
+            start = datetime.fromtimestamp(hour * SECONDS_PER_HOUR, self.tzinfo)
+            end = datetime.fromtimestamp(
+                (hour + 1) * SECONDS_PER_HOUR - 1, self.tzinfo
+            )
+            offset = start.utcoffset()
+            # The fold changes partway through the hour after clocks go back by
+            #  less than an hour, without the offset changing
+            if offset != end.utcoffset() or start.fold != end.fold:
+                self.hours[hour] = None
+            else:
+                self.hours[hour] = (int(offset.total_seconds()), start.fold)
+        return self.hours[hour]
+
+    def get_offset(self, epoch):
+        """
+        The UTC offset in seconds at the epoch seconds `epoch`.
+        """
+        cached = self._get_hour(epoch // SECONDS_PER_HOUR)
+        if cached is None:
+            local = datetime.fromtimestamp(epoch, self.tzinfo)
+            return int(local.utcoffset().total_seconds())
+        return cached[0]
+
+    def get_offsets(self, epochs):
+        """
+        `get_offset` for a numpy array of epoch seconds.
+        """
+        hours, inverse = np.unique(epochs // SECONDS_PER_HOUR, return_inverse=True)
+        cached = [self._get_hour(hour) for hour in hours.tolist()]
+        hour_offsets = np.array(
+            [offsets[0] if offsets else 0 for offsets in cached], dtype=np.int64
+        )
+        offsets = hour_offsets[inverse.ravel()]
+        transitions = np.array([offsets is None for offsets in cached], dtype=bool)
+        for i in np.flatnonzero(transitions[inverse.ravel()]):
+            offsets[i] = self.get_offset(int(epochs[i]))
+        return offsets
+
+    def to_local(self, utc_time):
+        """
+        Converts an aware datetime into the timezone, as `utc_time.astimezone` would.
+        """
+        cached = self._get_hour(int(utc_time.timestamp() // SECONDS_PER_HOUR))
+        if cached is None:
+            return utc_time.astimezone(self.tzinfo)
+        offset, fold = cached
+        local = utc_time.replace(tzinfo=None) - utc_time.utcoffset()
+        local += timedelta(seconds=offset)
+        return local.replace(tzinfo=self.tzinfo, fold=fold)
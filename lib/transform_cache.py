@@ -0,0 +1,112 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from lib.date_utils import END_OF_DAY_HOUR, MIDDAY_HOUR, PR_BREAKPOINT_HOUR
+
+# Bump whenever the classification changes, so old results aren't reused
+CACHE_VERSION = 1
+DEFAULT_MAX_ENTRIES = 500000
+# Keeps each statement under SQLite's limit on query parameters
+BATCH_SIZE = 500
+# Eviction only needs to know roughly when an entry was last used, so entries are
+#  only marked as used once in this many seconds
+LAST_USED_PRECISION = 24 * 60 * 60
+
+
+class TransformCache:
+    """
+    Remembers the reviews classified on each PR in an SQLite file, so PRs that haven't
+    changed since the last run don't have to be parsed or classified again.
+
+    Entries are keyed by a hash of the PR's compact JSON together with the timezone
+    and due time settings, so a PR that changes in any way, or a run with different
+    settings, misses the cache. Each entry holds the PR's creation time and author,
+    which the reports filter on, and its reviews. Once there are more than
+    `max_entries`, `evict` drops the least recently used.
+    """
+
+    def __init__(self, filename, tz, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        settings = [CACHE_VERSION, tz, PR_BREAKPOINT_HOUR, END_OF_DAY_HOUR, MIDDAY_HOUR]
+        self.settings_digest = hashlib.blake2b(
+            json.dumps(settings).encode("utf-8"), digest_size=20
+        )
+        # Workers of a parallel transform share the file
+        self.connection = sqlite3.connect(filename, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS reviews"
+            " (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS reviews_last_used ON reviews (last_used)"
+        )
+
+    def get_key(self, pr_json):
+        digest = self.settings_digest.copy()
+        digest.update(pr_json.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        """
+        Maps those of `keys` that are cached to their `(created, author, reviews)`,
+        marking them as used.
+        """
+        now = time.time()
+        found_keys, values, used_keys = [], [], []
+        keys = list(dict.fromkeys(keys))
+        for i in range(0, len(keys), BATCH_SIZE):
+            batch = keys[i : i + BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                "SELECT key, value, last_used FROM reviews"
+                f" WHERE key IN ({placeholders})",
+                batch,
+            )
+            for key, value, last_used in rows:
+                found_keys.append(key)
+                values.append(value)
+                if last_used < now - LAST_USED_PRECISION:
+                    used_keys.append(key)
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE reviews SET last_used = ? WHERE key = ?",
+                [(now, key) for key in used_keys],
+            )
+        # Decoding them all at once is much quicker than one at a time
+        return dict(zip(found_keys, json.loads("[" + ",".join(values) + "]")))
+
+    def put_many(self, entries):
+        """
+        Caches `(created, author, reviews)` under each key of `entries`, where `created`
+        is in epoch seconds and each review is a list of its fields.
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO reviews (key, value, last_used)"
+                " VALUES (?, ?, ?)",
+                [
+                    (key, json.dumps(entry, separators=(",", ":")), now)
+                    for key, entry in entries.items()
+                ],
+            )
+
+    def evict(self):
+        """
+        Drops the least recently used entries beyond `max_entries`. It should only run
+        once every file of a run has been looked up, as entries are only marked as
+        used once a day, so evicting part way through could drop some that the run
+        already used.
+        """
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM reviews WHERE key IN"
+                " (SELECT key FROM reviews ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def close(self):
+        self.connection.close()
@@ -3,12 +3,24 @@ import json
 import os
 import sys
 from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
 from typing import DefaultDict, Dict, List, NamedTuple
 
 import arrow
+import numpy as np
+from lib.classify import classify_reviews, classify_reviews_by_pr
 from lib.date_utils import *
+from lib.events import NO_TIME, EventTable
 from lib.models import *
+from lib.modules import load_module
+from lib.profiling import add_profile_arguments, get_profiler, start_profiling
+from lib.raw_data import *
+from lib.raw_store import RawStore
+from lib.transform_cache import DEFAULT_MAX_ENTRIES, TransformCache
+
+STATUSES = {status.value: status for status in ReviewStatus}
 
 IGNORE_EMPLOYEES = [
     "surbhikhr",
@@ -37,121 +49,120 @@ parser.add_argument(
     type=int,
     help="How many days back to consider PRs",
 )
-args = parser.parse_args()
-
-
-def transform_data(data, ignore_dependabot=True):
-    too_old = arrow.utcnow().to(args.tz).datetime - timedelta(days=args.days_old)
-    reviews: List[Review] = []
-    prs = [
-        pr for pr in data if arrow.get(pr["createdAt"]).to(args.tz).datetime > too_old
-    ]
-    if prs:
-        print(
-            "Found",
-            len(prs),
-            f" for the last ${args.days_old} days in",
-            prs[0]["baseRepository"]["name"],
+parser.add_argument(
+    "--events",
+    help="event table written by build_event_table.py to read instead of data/raw",
+)
+parser.add_argument(
+    "--store",
+    help="SQLite store written by import_raw_data.py to read only the recent PRs from",
+)
+parser.add_argument(
+    "--jobs",
+    "-j",
+    default=1,
+    type=int,
+    help="number of processes to transform the files in data/raw with",
+)
+parser.add_argument(
+    "--cache",
+    help="SQLite file to keep the reviews of each PR in, so unchanged PRs are skipped",
+)
+parser.add_argument(
+    "--cache-size",
+    default=DEFAULT_MAX_ENTRIES,
+    type=int,
+    help="number of PRs to keep in the cache, evicting the least recently used",
+)
+add_profile_arguments(parser)
+
+
+def transform_data(events, tz, too_old, ignore_dependabot=True):
+    """
+    Classifies the reviews on the PRs in `events` created after `too_old`, returning
+    them along with how many such PRs each repository has.
+    """
+    recent = events.pr_created > int(too_old.timestamp())
+    found = {
+        name: np.count_nonzero(recent & (events.pr_repository == repository))
+        for repository, name in enumerate(events.repositories)
+    }
+
+    prs = recent
+    if ignore_dependabot:
+        # The extra False at the end is picked for PRs without an author
+        is_dependabot = np.array(
+            ["dependabot" in login for login in events.logins] + [False], dtype=bool
         )
-    for pr in prs:
-        # dict from name of login of requested reviewer -> time review should be done
-        requested_reviews: Dict[str, arrow.Arrow] = {}
+        prs = prs & ~is_dependabot[events.pr_author]
 
-        if "dependabot" in pr["author"]["login"] and ignore_dependabot:
-            continue
-        # raw data transformation step
-        for item in pr["timelineItems"]["nodes"]:
-            # transform all datetime strings into localized arrow datetime objects
-            if "createdAt" in item:
-                item["createdAt"] = arrow.get(item["createdAt"]).to(args.tz)
-            if "submittedAt" in item:
-                item["submittedAt"] = arrow.get(item["submittedAt"]).to(args.tz)
-
-        # computation step
-        for item in pr["timelineItems"]["nodes"]:
-            typename = item["__typename"]
-            if typename == "ReviewRequestedEvent":
-                if not "login" in item["requestedReviewer"]:
-                    continue
-
-                reviewer = item["requestedReviewer"]["login"]
-                time_due = get_due_time(item["createdAt"])
-
-                requested_reviews[reviewer] = time_due
-
-            elif typename == "PullRequestReview":
-                time = item["submittedAt"]
-                reviewer = item["author"]["login"]
-
-                if reviewer in requested_reviews:
-                    time_due = requested_reviews[reviewer]
-
-                    if time <= time_due:
-                        reviews.append(
-                            Review(reviewer, ReviewStatus.ON_TIME, time_due.isoformat())
-                        )
-                    else:
-                        reviews.append(
-                            Review(reviewer, ReviewStatus.LATE, time_due.isoformat())
-                        )
-
-                    requested_reviews.pop(reviewer, None)
-                else:
-                    # someone submitted a review even though nobody requested it
-                    # we don't need to do anything in this case
-                    pass
-
-            elif typename == "ReviewRequestRemovedEvent":
-                if not "login" in item["requestedReviewer"]:
-                    continue
-
-                reviewer = item["requestedReviewer"]["login"]
-                time = item["createdAt"]
-
-                if reviewer in requested_reviews:
-                    time_due = requested_reviews[reviewer]
-
-                    # request for review was removed, *but* it is already after when the review should've been completed
-                    if time > time_due:
-                        reviews.append(
-                            Review(reviewer, ReviewStatus.LATE, time_due.isoformat())
-                        )
-                    # request for review was removed, before when the review should've been completed
-                    else:
-                        reviews.append(
-                            Review(
-                                reviewer, ReviewStatus.NO_RESPONSE, time_due.isoformat()
-                            )
-                        )
-
-                    requested_reviews.pop(reviewer, None)
-                else:
-                    # unusual state we don't expect to ever happen:
-                    print(
-                        f"Review request removed but reviewer #{reviewer} not found",
-                        file=sys.stderr,
-                    )
-
-            elif typename in ["ClosedEvent", "MergedEvent"]:
-                time = item["createdAt"]
-
-                # for every requested review when the PR is closed, see if it should've been completed yet or not
-                for reviewer, time_due in requested_reviews.items():
-                    if time > time_due:
-                        reviews.append(
-                            Review(reviewer, ReviewStatus.LATE, time_due.isoformat())
-                        )
-                    else:
-                        reviews.append(
-                            Review(
-                                reviewer, ReviewStatus.NO_RESPONSE, time_due.isoformat()
-                            )
-                        )
+    reviews = classify_reviews(events, tz, prs)
+    return found, [r for r in reviews if r.reviewer not in IGNORE_EMPLOYEES]
+
+
+def transform_file(filename, tz, too_old, ignore_dependabot=True):
+    """
+    `transform_data` for one raw data file. Everything it needs is passed in, so it
+    can run in a worker process. PRs created before `too_old` are skipped as the file
+    is read, mostly without being parsed.
+    """
+    repository_name = get_repository_name(os.path.basename(filename))
+    events = EventTable.from_pull_requests(
+        {repository_name: iter_pull_requests(filename, created_after=too_old)}
+    )
+    return transform_data(events, tz, too_old, ignore_dependabot=ignore_dependabot)
 
-            else:
-                print(f"Unknown type: {typename}", file=sys.stderr)
 
-    return [r for r in reviews if r.reviewer not in IGNORE_EMPLOYEES]
+def transform_cached_file(
+    filename, tz, too_old, cache_file, cache_size, ignore_dependabot=True
+):
+    """
+    `transform_file`, but only parsing and classifying the PRs that aren't already in
+    the `TransformCache` at `cache_file`.
+    """
+    repository_name = get_repository_name(os.path.basename(filename))
+    cache = TransformCache(cache_file, tz, cache_size)
+    lines = list(iter_pull_request_lines(filename, created_after=too_old))
+    keys = [cache.get_key(pr_json) for pr_json, _ in lines]
+    entries = cache.get_many(keys)
+
+    missing = {
+        key: pr if pr is not None else json.loads(pr_json)
+        for key, (pr_json, pr) in zip(keys, lines)
+        if key not in entries
+    }
+    if missing:
+        events = EventTable.from_pull_requests({repository_name: missing.values()})
+        reviews_by_pr = classify_reviews_by_pr(events, tz)
+        created = events.pr_created.tolist()
+        new_entries = {
+            key: [
+                created[i] if created[i] != NO_TIME else None,
+                events.get_login(events.pr_author[i]),
+                [list(review) for review in reviews_by_pr[i]],
+            ]
+            for i, key in enumerate(missing)
+        }
+        cache.put_many(new_entries)
+        entries.update(new_entries)
+    cache.close()
+
+    too_old = int(too_old.timestamp())
+    found = 0
+    reviews = []
+    for key in keys:
+        created, author, pr_reviews = entries[key]
+        if created is None or created <= too_old:
+            continue
+        found += 1
+        if ignore_dependabot and author and "dependabot" in author:
+            continue
+        reviews.extend(
+            Review(reviewer, STATUSES[status], time_due)
+            for reviewer, status, time_due in pr_reviews
+            if reviewer not in IGNORE_EMPLOYEES
+        )
+    return {repository_name: found}, reviews
 
 
 def write_transformed_file(reviews, output_filename):
@@ -163,23 +174,107 @@ def write_transformed_file(reviews, output_filename):
         )
 
 
-def get_file_list(directory):
-    return [f for f in os.listdir(directory) if f != "transformed.json"]
-
+def transform_directory(
+    directory,
+    tz,
+    days_old,
+    ignore_dependabot=True,
+    events_file=None,
+    store_file=None,
+    jobs=1,
+    cache_file=None,
+    cache_size=DEFAULT_MAX_ENTRIES,
+    output_filename=None,
+):
+    """
+    Classifies the reviews on the PRs in the raw data in `directory`, or in
+    `events_file` or `store_file`, created in the last `days_old` days, returning
+    them. They're only written out, for visualize_data.py, to `output_filename` if
+    it's given.
+    """
+    profiler = get_profiler()
+    too_old = arrow.utcnow().to(tz).datetime - timedelta(days=days_old)
+    if events_file or store_file:
+        with profiler.stage("read") as stage:
+            if events_file:
+                events = EventTable.load(events_file)
+            else:
+                store = RawStore(store_file)
+                events = store.load_events(created_after=too_old)
+                store.close()
+            stage.items += events.pr_count
+        with profiler.stage("transform") as stage:
+            results = [transform_data(events, tz, too_old, ignore_dependabot)]
+            stage.items += sum(sum(found.values()) for found, _ in results)
+    else:
+        filenames = [os.path.join(directory, f) for f in list_raw_files(directory)]
+        if cache_file:
+            transform = partial(
+                transform_cached_file,
+                tz=tz,
+                too_old=too_old,
+                cache_file=cache_file,
+                cache_size=cache_size,
+                ignore_dependabot=ignore_dependabot,
+            )
+        else:
+            transform = partial(
+                transform_file,
+                tz=tz,
+                too_old=too_old,
+                ignore_dependabot=ignore_dependabot,
+            )
+        # Reading and transforming each file happen together, in the workers if there
+        #  are any, whose stages aren't recorded
+        with profiler.stage("transform") as stage:
+            if jobs > 1:
+                # Results come back in the order of the files, whichever finishes
+                #  first. Workers that aren't forked, as on macOS and Windows, only
+                #  find this module under the name it was loaded as once it's loaded
+                #  in them too.
+                with ProcessPoolExecutor(
+                    max_workers=jobs,
+                    initializer=load_module,
+                    initargs=(__name__, os.path.abspath(__file__)),
+                ) as executor:
+                    results = list(executor.map(transform, filenames))
+            else:
+                results = [transform(filename) for filename in filenames]
+            stage.items += sum(sum(found.values()) for found, _ in results)
+        if cache_file:
+            # Once, after every file and worker is done with the cache
+            cache = TransformCache(cache_file, tz, cache_size)
+            cache.evict()
+            cache.close()
 
-def transform_directory(directory, ignore_dependabot=True):
     reviews = []
-    for input_file in get_file_list(directory):
-        with open(os.path.join(directory, input_file)) as fh:
-            data = json.load(fh)
-            reviews.extend(transform_data(data, ignore_dependabot=ignore_dependabot))
+    for found, file_reviews in results:
+        for name, count in found.items():
+            if count:
+                print("Found", count, f" for the last ${days_old} days in", name)
+        reviews.extend(file_reviews)
 
-    output_filename = os.path.join(directory, "transformed.json")
-    write_transformed_file(reviews, output_filename)
+    if output_filename:
+        with profiler.stage("write") as stage:
+            write_transformed_file(reviews, output_filename)
+            stage.items += len(reviews)
+    return reviews
 
 
-transform_directory(
-    os.path.join("data", "raw"),
-    # Maybe want to not ignore this for some repos?
-    ignore_dependabot=True,
-)
+if __name__ == "__main__":
+    args = parser.parse_args()
+    start_profiling("transform_data.py", args)
+    directory = os.path.join("data", "raw")
+    transform_directory(
+        directory,
+        tz=args.tz,
+        days_old=args.days_old,
+        # Maybe want to not ignore this for some repos?
+        ignore_dependabot=True,
+        events_file=args.events,
+        store_file=args.store,
+        jobs=args.jobs,
+        cache_file=args.cache,
+        cache_size=args.cache_size,
+        output_filename=os.path.join(directory, TRANSFORMED_FILENAME),
+    )
@@ -5,10 +5,9 @@ from collections import defaultdict, namedtuple
 from datetime import datetime
 from typing import Dict, DefaultDict, NamedTuple, List
 
-import chartify
-import pandas as pd
-
+from lib.charts import BarChart, Series, add_renderer_arguments, get_renderer
 from lib.models import *
+from lib.profiling import add_profile_arguments, get_profiler, start_profiling
 
 parser = argparse.ArgumentParser(description='Analyzes the output of parse_data.py and generates visualizations')
 parser.add_argument('output_filename', help='filename for the generated chart')
@@ -23,62 +22,108 @@ parser.add_argument(
     default=10,
     help='integer, representing the min number of reviews a user must have to show up in the chart'
 )
-args = parser.parse_args()
-
-if args.input_file:
-    with open(args.input_file, 'r') as f:
-        data = json.load(f)
-else:
-    data = json.load(sys.stdin)
-
-if args.group_file:
-    with open(args.group_file, 'r') as f:
-        group_to_users = json.load(f)
-
-# Create a `Reviews` object for each user
-reviews_by_user: DefaultDict[str, Reviews] = defaultdict(lambda: Reviews())
-for row in data:
-    reviews = reviews_by_user[row['reviewer']]
-    if row['status'] == ReviewStatus.ON_TIME:
-        reviews.on_time += 1
-    elif row['status'] == ReviewStatus.LATE:
-        reviews.late += 1
-    if row['status'] == ReviewStatus.NO_RESPONSE:
-        reviews.no_response += 1
-
-# create a data frame with a user, team, and on_time_ratio column
-users, on_time_ratios = zip(
-    *((k, v.on_time_ratio) for (k, v) in reviews_by_user.items() if v.total >= args.min_reviews)
-)
+add_renderer_arguments(parser)
+add_profile_arguments(parser)
 
-user_to_group = {}
-if args.group_file:
-    for k, v in group_to_users.items():
-        for x in v:
-            user_to_group[x] = k
-groups = [user_to_group.get(user, 'Other') for user in users]
-
-data_frame = pd.DataFrame({
-    'user': users,
-    'on_time_ratio': on_time_ratios,
-    'group': groups,
-})
-
-# create the chart of our results
-ch = chartify.Chart(blank_labels=True, x_axis_type='categorical')
-ch.set_title('On-time review rate')
-
-ch.plot.bar(
-    data_frame=data_frame,
-    categorical_columns=(['group', 'user'] if args.group_file else ['user']),
-    numeric_column='on_time_ratio',
-    **({'color_column': 'group'} if args.group_file else {}),
-).callout.line(
-    args.goal / 100,
-    line_dash='dashed',
-)
 
-ch.axes.set_yaxis_range(0, 1)
-ch.axes.set_yaxis_tick_format('0%')
-ch.axes.set_xaxis_tick_orientation(['diagonal', 'horizontal'])
-ch.save(args.output_filename)
+def read_reviews(input_file=None):
+    """
+    Reads the reviews written by transform_data.py from `input_file`, or stdin.
+    """
+    if input_file:
+        with open(input_file, 'r') as f:
+            data = json.load(f)
+    else:
+        data = json.load(sys.stdin)
+    return [Review(**row) for row in data]
+
+
+def read_groups(group_file):
+    with open(group_file, 'r') as f:
+        return json.load(f)
+
+
+def count_reviews(reviews: List[Review]) -> DefaultDict[str, Reviews]:
+    """
+    Creates a `Reviews` object for each user
+    """
+    reviews_by_user: DefaultDict[str, Reviews] = defaultdict(lambda: Reviews())
+    for review in reviews:
+        user_reviews = reviews_by_user[review.reviewer]
+        if review.status == ReviewStatus.ON_TIME:
+            user_reviews.on_time += 1
+        elif review.status == ReviewStatus.LATE:
+            user_reviews.late += 1
+        if review.status == ReviewStatus.NO_RESPONSE:
+            user_reviews.no_response += 1
+    return reviews_by_user
+
+
+def get_chart(reviews_by_user: Dict[str, Reviews], min_reviews, goal, group_to_users=None):
+    """
+    Creates the chart of our results, with a bar for the on_time_ratio of each user,
+    coloured by their group if `group_to_users` is given
+    """
+    user_to_group = {}
+    if group_to_users:
+        for k, v in group_to_users.items():
+            for x in v:
+                user_to_group[x] = k
+
+    rows = sorted(
+        (
+            (user_to_group.get(user, 'Other'), user, reviews.on_time_ratio)
+            for (user, reviews) in reviews_by_user.items()
+            if reviews.total >= min_reviews
+        ),
+        # By group, then best first
+        key=lambda row: (row[0] if group_to_users is not None else '', -row[2]),
+    )
+    groups, users, on_time_ratios = zip(*rows)
+
+    return BarChart(
+        title='On-time review rate',
+        categories=list(users),
+        series=[Series(on_time_ratios)],
+        groups=list(groups) if group_to_users is not None else None,
+        y_range=(0, 1),
+        y_ticks=[0, 0.2, 0.4, 0.6, 0.8, 1],
+        percent=True,
+        goal=goal / 100,
+    )
+
+
+def visualize(reviews: List[Review], output_filename, group_to_users=None, goal=75, min_reviews=10, renderer=None):
+    """
+    Charts the on-time review rate of each user with at least `min_reviews` `reviews`,
+    coloured by their group in `group_to_users` if given, with `renderer`, or as SVG.
+    """
+    profiler = get_profiler()
+    with profiler.stage('aggregate') as stage:
+        reviews_by_user = count_reviews(reviews)
+        stage.items += len(reviews_by_user)
+
+    chart = get_chart(reviews_by_user, min_reviews, goal, group_to_users)
+
+    with profiler.stage('render') as stage:
+        (renderer or get_renderer('svg')).render(chart, output_filename)
+        stage.items += len(chart.categories)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    profiler = start_profiling('visualize_data.py', args)
+
+    with profiler.stage('read') as stage:
+        reviews = read_reviews(args.input_file)
+        group_to_users = read_groups(args.group_file) if args.group_file else None
+        stage.items += len(reviews)
+
+    visualize(
+        reviews,
+        args.output_filename,
+        group_to_users,
+        goal=args.goal,
+        min_reviews=args.min_reviews,
+        renderer=get_renderer(args.renderer),
+    )
@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+
+from lib.charts import add_renderer_arguments, get_renderer
+from lib.download_options import add_download_arguments
+from lib.modules import load_module
+from lib.profiling import add_profile_arguments, start_profiling
+from lib.raw_data import TRANSFORMED_FILENAME
+from lib.transform_cache import DEFAULT_MAX_ENTRIES
+
+RAW_DIR = os.path.join("data", "raw")
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+
+
+def list_reports():
+    return sorted(
+        report
+        for report in os.listdir(REPORTS_DIR)
+        if os.path.isfile(os.path.join(REPORTS_DIR, report, "transform_data.py"))
+    )
+
+
+parser = argparse.ArgumentParser(
+    description="Runs every report in one process, from downloading the data, if"
+    " asked, through transforming it to charting it, passing the reviews between them"
+    " in memory rather than through data/raw/transformed.json"
+)
+parser.add_argument(
+    "--download",
+    action="store_true",
+    help="download the PRs to data/raw first, as download_all_data.py does",
+)
+add_download_arguments(parser)
+parser.add_argument(
+    "--reports",
+    default=list_reports(),
+    choices=list_reports(),
+    nargs="+",
+    help="reports to generate; defaults to all of them",
+)
+parser.add_argument(
+    "--output-dir",
+    default=os.path.join("data", "reports"),
+    help="directory to write each report's chart to, as <report>.html, or"
+    " <report>.png with matplotlib",
+)
+parser.add_argument(
+    "--write-transformed",
+    action="store_true",
+    help=f"also write each report's reviews to {RAW_DIR}/{TRANSFORMED_FILENAME}, as"
+    " its transform_data.py does",
+)
+parser.add_argument(
+    "--events",
+    help="event table written by build_event_table.py to read instead of data/raw",
+)
+parser.add_argument(
+    "--store",
+    help="SQLite store written by import_raw_data.py to read only the recent PRs from",
+)
+parser.add_argument(
+    "--jobs",
+    "-j",
+    default=1,
+    type=int,
+    help="number of processes to transform the files in data/raw with",
+)
+parser.add_argument(
+    "--cache",
+    help="SQLite file to keep the reviews of each PR in, so unchanged PRs are skipped",
+)
+parser.add_argument(
+    "--cache-size",
+    default=DEFAULT_MAX_ENTRIES,
+    type=int,
+    help="number of PRs to keep in the cache, evicting the least recently used",
+)
+parser.add_argument(
+    "-g",
+    "--group-file",
+    help="json file specifying a mapping from group to list of users",
+)
+parser.add_argument(
+    "--goal",
+    type=int,
+    default=75,
+    help="integer, from 0 to 100, representing the desired percent of on-time reviews",
+)
+parser.add_argument(
+    "--min-reviews",
+    type=int,
+    default=10,
+    help="integer, representing the min number of reviews a user must have to show"
+    " up in the chart",
+)
+add_renderer_arguments(parser)
+add_profile_arguments(parser)
+
+
+def load_report_script(report, script):
+    """
+    Imports `script` of `report` as a module. The reports' directories aren't
+    packages, and their names have hyphens, so they can't be imported by name.
+    """
+    return load_module(
+        f"report_{report.replace('-', '_')}_{script}",
+        os.path.join(REPORTS_DIR, report, f"{script}.py"),
+    )
+
+
+def run_report(report, args, renderer, group_to_users=None):
+    transform = load_report_script(report, "transform_data")
+    visualize = load_report_script(report, "visualize_data")
+
+    reviews = transform.transform_directory(
+        RAW_DIR,
+        tz=args.tz,
+        days_old=args.days_old,
+        ignore_dependabot=True,
+        events_file=args.events,
+        store_file=args.store,
+        jobs=args.jobs,
+        cache_file=args.cache,
+        cache_size=args.cache_size,
+        output_filename=(
+            os.path.join(RAW_DIR, TRANSFORMED_FILENAME)
+            if args.write_transformed
+            else None
+        ),
+    )
+    # A page to open in a browser, unless the renderer can only draw images
+    extension = "png" if args.renderer == "matplotlib" else "html"
+    visualize.visualize(
+        reviews,
+        os.path.join(args.output_dir, f"{report}.{extension}"),
+        group_to_users,
+        goal=args.goal,
+        min_reviews=args.min_reviews,
+        renderer=renderer,
+    )
+
+
+def print_banner(title):
+    print("=" * 80)
+    print(title.center(80).rstrip())
+    print("=" * 80)
+
+
+def run_pipeline(args):
+    profiler = start_profiling("run_pipeline.py", args)
+    if args.download:
+        # Only imported when it's needed, as requests and arrow are slow to import
+        from download_all_data import download_all_data
+
+        with profiler.stage("download"):
+            download_all_data(args)
+
+    group_to_users = None
+    if args.group_file:
+        with open(args.group_file) as fh:
+            group_to_users = json.load(fh)
+
+    renderer = get_renderer(args.renderer)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for report in args.reports:
+        print_banner(f"Generating report: {report}")
+        run_report(report, args, renderer, group_to_users)
+        print("=" * 80)
+
+
+if __name__ == "__main__":
+    run_pipeline(parser.parse_args())